@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+_YEAR_RE = re.compile(r"(?<!\d)((?:19|20)\d{2})[a-z]?(?!\d)")
+_CAP_WORD_RE = re.compile(r"\b[A-Z][A-Za-z'’\-]{1,}\b")
+_AUTHOR_NAME_RE = re.compile(r"\b[A-Z][a-z]+(?:[\s\-]+[A-Z]\.?)*\s+([A-Z][A-Za-z'’\-]{1,})\b")
+_STOP = {"and", "et", "al", "the", "of", "in", "on", "for", "a", "an", "see", "cf", "eg", "ie"}
+# 期刊名、机构、栏目标题中常见的词：含这些词的行不视为作者署名行
+_NON_NAME = {
+    "journal", "review", "proceedings", "conference", "press", "university", "department", "institute",
+    "school", "college", "center", "centre", "society", "science", "sciences", "studies", "research",
+    "health", "policy", "change", "abstract", "introduction", "volume", "issue", "vol",
+}
+_FOOTNOTE_MARK_RE = re.compile(r"[*†‡§¹²³⁴⁵⁶⁷⁸⁹⁰]")
+_BYLINE_FILLER_RE = re.compile(r"[\s,;&\d]+")
+# 首页中标明本文出版年份的写法；其余年份多为被引文献，不作兜底
+_PUB_YEAR_RE = re.compile(
+    r"(?:©|\(c\)|copyright|published(?:\s+online)?|accepted)\D{0,40}?((?:19|20)\d{2})(?!\d)", re.I
+)
+
+HEAD_CHARS = 3000
+# 模糊匹配只接受编辑距离 <= 1，且姓氏至少这么长（过短的姓氏差一个字母就是另一个姓）
+FUZZY_MIN_LEN = 4
+
+
+def _fold(text: str) -> str:
+    """去掉变音符号：García -> Garcia，Müller -> Muller。"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _norm(word: str) -> str:
+    return _fold(word).replace("’", "'").strip(".,;:'\"").lower()
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """a 与 b 的编辑距离（插入/删除/替换）是否 <= 1。"""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1 :] == b[i + 1 :]
+    return a[i:] == b[i + 1 :]
+
+
+def _filename_parts(raw_relpath: Optional[str]) -> tuple[List[str], List[str]]:
+    """从文件名提取 (年份列表, 大写开头的词)，如 Smith_Jones_2019_Urban heat.pdf。"""
+    if not raw_relpath:
+        return [], []
+    stem = Path(str(raw_relpath)).stem
+    stem = re.sub(r"_part_\d+$", "", stem)
+    years = [m.group(1) for m in _YEAR_RE.finditer(stem)]
+    ym = _YEAR_RE.search(stem)
+    # 年份之前的词通常是作者；没有年份时无法区分作者与标题，不从文件名推断作者
+    lead = re.split(r"[\s_\-\.,()]+", stem[: ym.start()]) if ym else []
+    authors = [w for w in lead if w[:1].isupper() and _norm(w) not in _STOP]
+    return years, authors
+
+
+def _byline_authors(line: str) -> List[str]:
+    """
+    若该行是作者署名行（如 "Jane A. Smith, John Doe and Mary Lee¹"），返回其中的姓氏；否则返回空列表。
+    去掉人名、连接词与脚注标记后仍有剩余文字的行（标题、期刊名等）不算署名行。
+    """
+    line = _fold(_FOOTNOTE_MARK_RE.sub(" ", line))
+    names = list(_AUTHOR_NAME_RE.finditer(line))
+    if not names:
+        return []
+    if any(_norm(w) in _NON_NAME for m in names for w in m.group(0).split()):
+        return []
+    rest = re.sub(r"\band\b", " ", _AUTHOR_NAME_RE.sub(" ", line))
+    if _BYLINE_FILLER_RE.sub("", rest):
+        return []
+    return [m.group(1) for m in names]
+
+
+def build_bib_record(doc_meta: Dict[str, Any], first_pages: List[str]) -> Dict[str, Any]:
+    """
+    为单个文档构建书目记录：优先使用 meta 中显式的 authors/year/title，
+    再从文件名与首页文本中启发式补全。
+    """
+    head = "\n".join(first_pages)[:HEAD_CHARS]
+    title = doc_meta.get("title")
+    if not title:
+        for line in head.splitlines():
+            line = line.strip().lstrip("#").strip()
+            if 10 <= len(line) <= 200:
+                title = line
+                break
+
+    fn_years, fn_authors = _filename_parts(doc_meta.get("raw_relpath") or doc_meta.get("split_from"))
+
+    authors: List[str] = []
+    meta_authors = doc_meta.get("authors")
+    if isinstance(meta_authors, str):
+        meta_authors = re.split(r"\s*(?:;| and | & )\s*", meta_authors)
+    for a in meta_authors or []:
+        # "Smith, Jane" -> Smith；"Jane Smith" -> Smith
+        a = str(a).strip()
+        if "," in a:
+            authors.append(a.split(",")[0].strip())
+        elif a.split():
+            authors.append(a.split()[-1])
+    authors += fn_authors
+    # 首页前若干行中的作者署名行；标题行不参与
+    for line in head.splitlines()[:20]:
+        line = line.strip().lstrip("#").strip()
+        if line and line != title:
+            authors += _byline_authors(line)
+
+    years = [str(doc_meta["year"])] if doc_meta.get("year") else []
+    years += fn_years
+    if not years:
+        pub = _PUB_YEAR_RE.search(head)
+        if pub:
+            years.append(pub.group(1))
+
+    seen = set()
+    surnames = []
+    for a in authors:
+        n = _norm(a)
+        if n and n not in seen and n not in _STOP:
+            seen.add(n)
+            surnames.append(n)
+    return {
+        "doc_uid": doc_meta.get("doc_uid"),
+        "citable": bool(doc_meta.get("citable", True)),
+        "source_type": doc_meta.get("source_type", "evidence"),
+        "authors": surnames,
+        "year": years[0] if years else None,
+        "years": sorted(set(years)),
+        "title": title or "",
+    }
+
+
+def parse_citation_query(query: str) -> tuple[List[str], Optional[str]]:
+    """'Smith and Jones 2019' -> (['smith', 'jones'], '2019')"""
+    query = _fold(query)
+    ym = None
+    for m in _YEAR_RE.finditer(query):
+        ym = m
+    year = ym.group(1) if ym else None
+    names = query[: ym.start()] if ym else query
+    surnames = [_norm(w) for w in _CAP_WORD_RE.findall(names)]
+    return [s for s in surnames if s and s not in _STOP], year
+
+
+class BibIndex:
+    """
+    内存中的作者-年份索引：按年份分桶，要求引用中的每个姓氏都在记录的作者列表中。
+    精确匹配未命中时做有界模糊匹配（姓氏编辑距离 <= 1，年份仍须一致）；
+    未命中或多篇文档同时命中时返回 None，由调用方回退到向量检索。
+    """
+
+    def __init__(self, records: Iterable[Dict[str, Any]]):
+        self.records = [r for r in records if r.get("doc_uid") and r.get("citable")]
+        self.by_year: Dict[str, List[Dict[str, Any]]] = {}
+        for r in self.records:
+            for y in r.get("years", []):
+                self.by_year.setdefault(y, []).append(r)
+            r["_authors"] = {_norm(a) for a in r.get("authors", [])}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _unique(self, hits: List[Dict[str, Any]], year: str) -> Optional[Dict[str, Any]]:
+        if len(hits) > 1:
+            # 主年份优先于文件名等来源中的其他年份
+            primary = [r for r in hits if r.get("year") == year]
+            if primary:
+                hits = primary
+        return hits[0] if len(hits) == 1 else None
+
+    def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        names, year = parse_citation_query(query)
+        if not names or not year:
+            return None
+        candidates = self.by_year.get(year, [])
+        exact = [r for r in candidates if all(n in r["_authors"] for n in names)]
+        if exact:
+            best, match, score = self._unique(exact, year), "exact", 1.0
+        else:
+            fuzzy = [
+                r for r in candidates
+                if all(
+                    n in r["_authors"]
+                    or (len(n) >= FUZZY_MIN_LEN and any(_within_one_edit(n, a) for a in r["_authors"]))
+                    for n in names
+                )
+            ]
+            best, match, score = self._unique(fuzzy, year), "fuzzy", 0.9
+        if best is None:
+            return None
+        return {
+            "doc_uid": best["doc_uid"],
+            "source_type": best.get("source_type", ""),
+            "score": score,
+            "match": match,
+            "text": best.get("title", ""),
+        }
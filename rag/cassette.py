@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .logger import get_logger
+
+logger = get_logger()
+
+# Vertex 调用的录制/回放（用于离线性能基准与回归检查）：
+#   RAG_CASSETTE=meta/session.cassette.jsonl  RAG_CASSETTE_MODE=record|replay
+#   RAG_CASSETTE_LATENCY_SCALE=1.0（回放时按原始延迟的倍数 sleep，0 表示不等待）
+# 录制文件为 JSONL，每行一次请求：{"t": "embed"|"gen", "k": 请求指纹, "lat": 秒, "r": 响应}
+# 向量以 float32 base64 存储以保持文件紧凑。
+
+
+class CassetteMiss(KeyError):
+    """回放模式下请求不在录制文件中。"""
+
+
+def _key(*parts: Any) -> str:
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _config_dict(generation_config: Any) -> Dict[str, Any]:
+    if generation_config is None:
+        return {}
+    to_dict = getattr(generation_config, "to_dict", None)
+    if callable(to_dict):
+        try:
+            return to_dict()
+        except Exception:
+            pass
+    return dict(getattr(generation_config, "__dict__", {}))
+
+
+def _pack_vector(values: List[float]) -> str:
+    return base64.b64encode(np.asarray(values, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _unpack_vector(data: str) -> List[float]:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).tolist()
+
+
+class Cassette:
+    def __init__(self, path: Path, mode: str, latency_scale: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"RAG_CASSETTE_MODE 只能是 record 或 replay: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if mode == "replay":
+            if not path.exists():
+                raise FileNotFoundError(f"未找到录制文件: {path}")
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        e = json.loads(line)
+                        # 同一请求录到多次时以第一次为准，保证回放确定
+                        self._entries.setdefault(e["k"], e)
+            logger.info(f"cassette 回放: {path} ({len(self._entries)} 条)")
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            logger.info(f"cassette 录制: {path}")
+
+    def _append(self, entries: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for e in entries:
+                    f.write(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def _lookup(self, key: str, what: str) -> Dict[str, Any]:
+        e = self._entries.get(key)
+        if e is None:
+            raise CassetteMiss(f"录制文件中没有该 {what} 请求（{key}），请重新录制")
+        return e
+
+    def _sleep(self, seconds: float) -> None:
+        if self.latency_scale > 0 and seconds > 0:
+            time.sleep(seconds * self.latency_scale)
+
+    def embedding_model(self, model_name: str, real_model: Any = None) -> "_EmbeddingModel":
+        return _EmbeddingModel(self, model_name, real_model)
+
+    def generative_model(self, model_name: str, real_model: Any = None) -> "_GenerativeModel":
+        return _GenerativeModel(self, model_name, real_model)
+
+
+def is_proxy(model: Any) -> bool:
+    """model 是否为录制/回放代理（只实现公开的 generate_content/get_embeddings）。"""
+    return isinstance(model, (_EmbeddingModel, _GenerativeModel))
+
+
+class _EmbeddingModel:
+    """替代 TextEmbeddingModel：按单条输入录制/回放，与批大小无关。"""
+
+    def __init__(self, cassette: Cassette, model_name: str, real_model: Any):
+        self.cassette = cassette
+        self.model_name = model_name
+        self.real_model = real_model
+
+    def _keys(self, inputs: List[Any], output_dimensionality: Optional[int]) -> List[str]:
+        return [
+            _key("embed", self.model_name, getattr(i, "task_type", None), getattr(i, "text", i), output_dimensionality)
+            for i in inputs
+        ]
+
+    def get_embeddings(self, inputs: List[Any], output_dimensionality: Optional[int] = None):
+        keys = self._keys(inputs, output_dimensionality)
+        if self.cassette.mode == "replay":
+            entries = [self.cassette._lookup(k, "embedding") for k in keys]
+            self.cassette._sleep(sum(e["lat"] for e in entries))
+            return [SimpleNamespace(values=_unpack_vector(e["r"])) for e in entries]
+
+        start = time.time()
+        if output_dimensionality:
+            result = self.real_model.get_embeddings(inputs, output_dimensionality=output_dimensionality)
+        else:
+            result = self.real_model.get_embeddings(inputs)
+        per_input = (time.time() - start) / max(len(inputs), 1)
+        self.cassette._append([
+            {"t": "embed", "k": k, "lat": round(per_input, 4), "r": _pack_vector(e.values)}
+            for k, e in zip(keys, result)
+        ])
+        return result
+
+
+class _GenerativeModel:
+    """替代 GenerativeModel：按 prompt + 生成配置录制/回放。"""
+
+    def __init__(self, cassette: Cassette, model_name: str, real_model: Any):
+        self.cassette = cassette
+        self.model_name = model_name
+        self.real_model = real_model
+
+    def generate_content(self, prompt: Any, generation_config: Any = None):
+        key = _key("gen", self.model_name, prompt, _config_dict(generation_config))
+        if self.cassette.mode == "replay":
+            e = self.cassette._lookup(key, "generation")
+            self.cassette._sleep(e["lat"])
+            usage = e["r"].get("usage") or {}
+            return SimpleNamespace(text=e["r"]["text"], usage_metadata=SimpleNamespace(**usage))
+
+        start = time.time()
+        if generation_config is not None:
+            response = self.real_model.generate_content(prompt, generation_config=generation_config)
+        else:
+            response = self.real_model.generate_content(prompt)
+        latency = time.time() - start
+        meta = getattr(response, "usage_metadata", None)
+        usage = {
+            "prompt_token_count": int(getattr(meta, "prompt_token_count", 0) or 0),
+            "candidates_token_count": int(getattr(meta, "candidates_token_count", 0) or 0),
+        }
+        self.cassette._append([
+            {"t": "gen", "k": key, "lat": round(latency, 4), "r": {"text": response.text, "usage": usage}}
+        ])
+        return response
+
+
+_active: Optional[Cassette] = None
+_active_lock = threading.Lock()
+
+
+def active() -> Optional[Cassette]:
+    """根据环境变量懒加载当前进程的录制/回放器；未设置时返回 None。"""
+    global _active
+    path = os.environ.get("RAG_CASSETTE")
+    if not path:
+        return None
+    with _active_lock:
+        if _active is None:
+            mode = os.environ.get("RAG_CASSETTE_MODE", "replay").strip().lower()
+            scale = float(os.environ.get("RAG_CASSETTE_LATENCY_SCALE", "1.0"))
+            _active = Cassette(Path(path), mode, scale)
+        return _active
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .logger import get_logger
+from .utils import ensure_dir, now_ts
+
+logger = get_logger()
+
+CATALOG_FILE = "catalog.sqlite"
+
+# 文档元数据列（parse/import-client/meta set 写入，chunk 读取）；其余键存入 extra
+_META_COLUMNS = ("citable", "source_type", "raw_relpath", "split_from", "page_range", "authors", "year", "title", "accessed_at")
+_JSON_COLUMNS = {"page_range", "authors"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc_uid     TEXT PRIMARY KEY,
+    citable     INTEGER NOT NULL DEFAULT 1,
+    source_type TEXT NOT NULL DEFAULT 'evidence',
+    raw_relpath TEXT,
+    split_from  TEXT,
+    page_range  TEXT,
+    authors     TEXT,
+    year        TEXT,
+    title       TEXT,
+    accessed_at TEXT,
+    extra       TEXT,
+    n_parents   INTEGER,
+    n_chunks    INTEGER,
+    bib         TEXT,
+    chunked_at  TEXT,
+    chunk_order INTEGER,
+    updated_at  TEXT
+);
+CREATE TABLE IF NOT EXISTS catalog_info (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class DocCatalog:
+    """
+    文档目录：meta/catalog.sqlite 中每个 doc_uid 一行，取代逐文档的 meta/{doc_uid}.json。
+
+    - 元数据（citable/source_type/raw_relpath/split_from/page_range/书目字段）由 parse、import-client、meta set 写入
+    - 分块统计（parent/child 数）与推断出的书目记录由 chunk 写入
+    - 按主键查询，读取方无需扫描 chunks
+    - 首次打开时自动迁移旧版 meta/*.json（原文件保留）
+    """
+
+    def __init__(self, meta_dir: Path):
+        ensure_dir(meta_dir)
+        self.meta_dir = meta_dir
+        self.path = meta_dir / CATALOG_FILE
+        self._conn = sqlite3.connect(self.path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+        self._add_missing_columns()
+        self._migrate_legacy()
+
+    def __enter__(self) -> "DocCatalog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # ---------- 元数据 ----------
+
+    @staticmethod
+    def _meta_row(doc_meta: Dict[str, Any]) -> Dict[str, Any]:
+        row: Dict[str, Any] = {}
+        extra = {k: v for k, v in doc_meta.items() if k not in _META_COLUMNS and k != "doc_uid"}
+        for col in _META_COLUMNS:
+            v = doc_meta.get(col)
+            if col == "citable":
+                v = 1 if (v is None or bool(v)) else 0
+            elif col == "source_type":
+                v = v or "evidence"
+            elif col in _JSON_COLUMNS and v is not None:
+                v = json.dumps(v, ensure_ascii=False)
+            elif col == "year" and v is not None:
+                v = str(v)
+            row[col] = v
+        row["extra"] = json.dumps(extra, ensure_ascii=False) if extra else None
+        return row
+
+    @staticmethod
+    def _to_meta(row: sqlite3.Row) -> Dict[str, Any]:
+        """行 -> 与旧版 meta/{doc_uid}.json 相同形状的字典（空字段省略）"""
+        meta: Dict[str, Any] = {"doc_uid": row["doc_uid"]}
+        for col in _META_COLUMNS:
+            v = row[col]
+            if col == "citable":
+                v = bool(v)
+            elif v is None:
+                continue
+            elif col in _JSON_COLUMNS:
+                v = json.loads(v)
+            meta[col] = v
+        if row["extra"]:
+            meta.update(json.loads(row["extra"]))
+        return meta
+
+    def upsert(self, doc_meta: Dict[str, Any], commit: bool = True) -> None:
+        """写入/覆盖文档元数据；分块统计与书目记录保持不变。"""
+        row = self._meta_row(doc_meta)
+        cols = list(row)
+        self._conn.execute(
+            f"INSERT INTO docs (doc_uid, {', '.join(cols)}, updated_at) VALUES (?, {', '.join('?' for _ in cols)}, ?) "
+            f"ON CONFLICT(doc_uid) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in cols)}, updated_at=excluded.updated_at",
+            [doc_meta["doc_uid"], *row.values(), now_ts()],
+        )
+        if commit:
+            self._conn.commit()
+
+    def update(self, doc_uid: str, **fields: Any) -> bool:
+        """合并更新部分字段；文档不存在时返回 False。"""
+        meta = self.get(doc_uid)
+        if meta is None:
+            return False
+        meta.update(fields)
+        self.upsert(meta)
+        return True
+
+    def get(self, doc_uid: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT * FROM docs WHERE doc_uid = ?", (doc_uid,)).fetchone()
+        return self._to_meta(row) if row is not None else None
+
+    def get_many(self, doc_uids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        uids = list(dict.fromkeys(doc_uids))
+        out: Dict[str, Dict[str, Any]] = {}
+        # SQLite 默认单条语句最多 999 个参数
+        for i in range(0, len(uids), 500):
+            part = uids[i : i + 500]
+            rows = self._conn.execute(
+                f"SELECT * FROM docs WHERE doc_uid IN ({', '.join('?' for _ in part)})", part
+            ).fetchall()
+            out.update({r["doc_uid"]: self._to_meta(r) for r in rows})
+        return out
+
+    def citable(self, doc_uid: str) -> bool:
+        row = self._conn.execute("SELECT citable FROM docs WHERE doc_uid = ?", (doc_uid,)).fetchone()
+        return bool(row["citable"]) if row is not None else False
+
+    # ---------- 分块统计 ----------
+
+    def set_chunk_stats(self, stats: Iterable[tuple]) -> None:
+        """
+        stats: (doc_uid, n_parents, n_chunks, bib_record) 序列，按 chunks 中的文档顺序给出，一个事务内写入。
+        无元数据的文档按默认值建行。
+        """
+        ts = now_ts()
+        self._conn.executemany(
+            "INSERT INTO docs (doc_uid, n_parents, n_chunks, bib, chunked_at, chunk_order, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(doc_uid) DO UPDATE SET n_parents=excluded.n_parents, n_chunks=excluded.n_chunks, "
+            "bib=excluded.bib, chunked_at=excluded.chunked_at, chunk_order=excluded.chunk_order",
+            [
+                (uid, p, c, json.dumps(bib, ensure_ascii=False) if bib else None, ts, i, ts)
+                for i, (uid, p, c, bib) in enumerate(stats)
+            ],
+        )
+        self._conn.commit()
+
+    def clear_chunk_stats(self, doc_uids: Iterable[str]) -> None:
+        self._conn.executemany(
+            "UPDATE docs SET n_parents=NULL, n_chunks=NULL, bib=NULL, chunked_at=NULL, chunk_order=NULL WHERE doc_uid = ?",
+            [(u,) for u in doc_uids],
+        )
+        self._conn.commit()
+
+    def chunked_doc_uids(self) -> List[str]:
+        """
+        有 child chunk 的文档，按 chunks 中的文档顺序。
+        只反映最近一次 rag chunk 写入的统计：目录建立前的分块结果需重新 chunk 后才会出现在这里。
+        """
+        rows = self._conn.execute(
+            "SELECT doc_uid FROM docs WHERE n_chunks > 0 ORDER BY chunk_order IS NULL, chunk_order, doc_uid"
+        ).fetchall()
+        return [r["doc_uid"] for r in rows]
+
+    def bib_records(self) -> List[Dict[str, Any]]:
+        rows = self._conn.execute("SELECT bib FROM docs WHERE bib IS NOT NULL ORDER BY doc_uid").fetchall()
+        return [json.loads(r["bib"]) for r in rows]
+
+    # ---------- 迁移 ----------
+
+    def _add_missing_columns(self) -> None:
+        # 旧版目录文件缺少后来新增的列
+        existing = {r["name"] for r in self._conn.execute("PRAGMA table_info(docs)")}
+        if "chunk_order" not in existing:
+            self._conn.execute("ALTER TABLE docs ADD COLUMN chunk_order INTEGER")
+            self._conn.commit()
+
+    def _migrate_legacy(self) -> None:
+        done = self._conn.execute("SELECT value FROM catalog_info WHERE key = 'legacy_meta_migrated'").fetchone()
+        if done is not None:
+            return
+        migrated = 0
+        # meta/ 下还有 project.json、各类缓存等；只迁移 doc_uid 与文件名一致的文档元数据
+        for f in sorted(self.meta_dir.glob("*.json")):
+            if f.stat().st_size > 64 * 1024:
+                continue
+            try:
+                data = json.loads(f.read_text(encoding="utf-8"))
+            except Exception:
+                continue
+            if not isinstance(data, dict) or data.get("doc_uid") != f.stem:
+                continue
+            self.upsert(data, commit=False)
+            migrated += 1
+        self._conn.execute(
+            "INSERT OR REPLACE INTO catalog_info (key, value) VALUES ('legacy_meta_migrated', ?)", (now_ts(),)
+        )
+        self._conn.commit()
+        if migrated:
+            logger.info(f"已将 {migrated} 个 meta/*.json 迁移到 {self.path.name}")
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# chunks/ 下的列式存储：parents.parquet / chunks.parquet
+# - 读取时按列投影（只读 doc_uid/citable 时不会触及 text 列），并以 memory_map 打开
+# - 合并文件按文档顺序写入，row group 的 doc_uid 统计可用于按文档过滤时跳过无关行组
+# - 兼容旧流程的 JSONL 由 `rag export-chunks` 按需导出
+
+PARENTS_FILE = "parents.parquet"
+CHUNKS_FILE = "chunks.parquet"
+ROW_GROUP_SIZE = 8192
+
+PARENT_SCHEMA = pa.schema([
+    ("doc_uid", pa.string()),
+    ("parent_id", pa.string()),
+    ("page_index", pa.int32()),
+    ("parent_text", pa.string()),
+    ("citable", pa.bool_()),
+    ("source_type", pa.string()),
+    ("hash", pa.string()),
+])
+
+CHUNK_SCHEMA = pa.schema([
+    ("chunk_id", pa.string()),
+    ("parent_id", pa.string()),
+    ("doc_uid", pa.string()),
+    ("text", pa.string()),
+    ("char_start", pa.int64()),
+    ("char_end", pa.int64()),
+    ("page_index", pa.int32()),
+    ("citable", pa.bool_()),
+    ("source_type", pa.string()),
+    ("hash", pa.string()),
+])
+CHUNK_FIELDS = tuple(CHUNK_SCHEMA.names)
+
+
+class ChunkRecord:
+    """
+    child chunk 记录：字段与 CHUNK_SCHEMA 一一对应，用 __slots__ 代替逐条 dict，
+    分块、写盘与 embed 全程传递该类型。
+    """
+
+    __slots__ = CHUNK_FIELDS
+
+    def __init__(
+        self,
+        chunk_id: str,
+        parent_id: str,
+        doc_uid: str,
+        text: str,
+        char_start: int,
+        char_end: int,
+        page_index: Optional[int],
+        citable: bool,
+        source_type: str,
+        hash: str,
+    ):
+        self.chunk_id = chunk_id
+        self.parent_id = parent_id
+        self.doc_uid = doc_uid
+        self.text = text
+        self.char_start = char_start
+        self.char_end = char_end
+        self.page_index = page_index
+        self.citable = citable
+        self.source_type = source_type
+        self.hash = hash
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in CHUNK_FIELDS}
+
+    def __repr__(self) -> str:
+        return f"ChunkRecord({self.chunk_id!r})"
+
+
+def parents_path(chunks_dir: Path) -> Path:
+    return Path(chunks_dir) / PARENTS_FILE
+
+
+def chunks_path(chunks_dir: Path) -> Path:
+    return Path(chunks_dir) / CHUNKS_FILE
+
+
+def _tmp(path: Path) -> Path:
+    return path.with_name(path.name + ".tmp")
+
+
+def records_table(records: Iterable[Any], schema: pa.Schema = CHUNK_SCHEMA, vectors: Optional[np.ndarray] = None) -> pa.Table:
+    """
+    按列构建 Arrow 表。records 为 ChunkRecord 或 dict；
+    vectors 为 (n, dim) float32 连续块时追加 vector 列（直接包装该内存，不逐元素转换）。
+    """
+    records = list(records)
+    if records and isinstance(records[0], dict):
+        columns = [[r.get(name) for r in records] for name in schema.names]
+    else:
+        columns = [[getattr(r, name) for r in records] for name in schema.names]
+    arrays = [pa.array(col, type=field.type) for col, field in zip(columns, schema)]
+    names = list(schema.names)
+    if vectors is not None:
+        flat = pa.array(np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1))
+        arrays.append(pa.FixedSizeListArray.from_arrays(flat, vectors.shape[1]))
+        names.append("vector")
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def write_records(path: Path, records: Iterable[Any], schema: pa.Schema) -> None:
+    """按 schema 写出一组记录（可为空），先写临时文件再原子替换。"""
+    table = records_table(records, schema)
+    tmp = _tmp(path)
+    try:
+        pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def concat_files(out_path: Path, files: List[Path], schema: pa.Schema) -> None:
+    """按顺序拼接多个分片文件为一个文件；逐个分片读写，内存以单个分片为上限。"""
+    tmp = _tmp(out_path)
+    try:
+        with pq.ParquetWriter(tmp, schema) as writer:
+            for f in files:
+                if f.exists():
+                    writer.write_table(pq.read_table(f, memory_map=True), row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp, out_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def read_table(path: Path, columns: Optional[List[str]] = None, doc_uid: Optional[str] = None) -> Optional[pa.Table]:
+    """读取列式文件，只解码 columns 指定的列；doc_uid 给定时只返回该文档的行。文件不存在返回 None。"""
+    if not path.exists():
+        return None
+    filters = [("doc_uid", "=", doc_uid)] if doc_uid else None
+    return pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+
+
+def load_chunks(chunks_dir: Path, doc_uid: Optional[str] = None) -> List[ChunkRecord]:
+    """读取 child 记录（可按 doc_uid 过滤）；逐列解码后直接构造 ChunkRecord，不经中间 dict。"""
+    table = read_table(chunks_path(chunks_dir), columns=list(CHUNK_FIELDS), doc_uid=doc_uid)
+    if table is None:
+        return []
+    columns = [table.column(name).to_pylist() for name in CHUNK_FIELDS]
+    return [ChunkRecord(*values) for values in zip(*columns)]
+
+
+def load_parents_map(chunks_dir: Path) -> Dict[str, Dict[str, Any]]:
+    table = read_table(parents_path(chunks_dir))
+    if table is None:
+        return {}
+    return {p["parent_id"]: p for p in table.to_pylist()}
+
+
+def export_jsonl(src: Path, dest: Path, batch_size: int = 4096) -> int:
+    """将列式文件按批流式导出为 JSONL（兼容旧格式），返回行数。"""
+    n = 0
+    tmp = _tmp(dest)
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            if src.exists():
+                for batch in pq.ParquetFile(src, memory_map=True).iter_batches(batch_size=batch_size):
+                    for r in batch.to_pylist():
+                        f.write(json.dumps(r, ensure_ascii=False) + "\n")
+                        n += 1
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return n
@@ -1,45 +1,305 @@
 import json
 import hashlib
+import os
 import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
+
+
+from . import chunk_store
+from .chunk_store import ChunkRecord
+from .bib_index import build_bib_record
+from .catalog import DocCatalog
+from .dedup import NearDupIndex
 from .logger import get_logger
-from .utils import ensure_dir, write_json, now_ts
+from .tokens import token_prefix
+from .utils import ensure_dir, read_json, now_ts, sha256_str
 
 logger = get_logger()
 
+# 分块逻辑版本号：切分规则变化时递增，使已有分片全部失效重建
+CHUNKER_VERSION = "pc-v4"
+
+# 页眉页脚检测：文档至少有这么多页才启用；只考虑不超过该长度、且位于每页首尾若干行内的行
+HEADER_FOOTER_MIN_PAGES = 3
+HEADER_FOOTER_MAX_LINE = 120
+HEADER_FOOTER_EDGE_LINES = 3
+_DIGITS_RE = re.compile(r"\d+")
+
+# 分块回看：标点在可接受尾部之前多扫描的字符数。尾部之前的标点最多把记录的结束位置推进到尾部前 1 个字符，
+# 多看 4 个字符后其对尾部内标点的遮挡不会改变最终结果
+_PUNCT_MARGIN = 4
+
+
+def _norm_line(line: str) -> str:
+    return _DIGITS_RE.sub("#", " ".join(line.split()).lower())
+
+
+def _page_edge_lines(texts: List[str]) -> set:
+    """一页中位于开头/结尾 HEADER_FOOTER_EDGE_LINES 个非空行的位置 {(块序号, 行序号)}"""
+    positions = [
+        (ti, li) for ti, text in enumerate(texts) for li, line in enumerate(text.splitlines()) if line.strip()
+    ]
+    n = HEADER_FOOTER_EDGE_LINES
+    return set(positions[:n]) | set(positions[-n:])
+
+
+# MinerU JSON 选择结果缓存（位于 parsed/<doc_uid>/，以 . 开头，不参与输入指纹）
+JSON_SOURCE_CACHE = ".chunk_json_source.json"
+# 格式判断规则变化时递增，使已缓存的选择失效
+JSON_SOURCE_CACHE_VERSION = 2
+SNIFF_BYTES = 64 * 1024
+# content_list 元素中分块实际用到的字段
+_CONTENT_FIELDS = ("type", "text", "page_idx")
+_WS = " \t\r\n"
+
+
+def _json_listing(doc_dir: Path) -> List[List[Any]]:
+    """doc 目录中 JSON 文件的 (名称, 大小, mtime)，用于判断选择缓存是否仍有效"""
+    out = []
+    for p in sorted(doc_dir.glob("*.json")):
+        if p.name.startswith("."):
+            continue
+        st = p.stat()
+        out.append([p.name, st.st_size, st.st_mtime_ns])
+    return out
+
+
+class _Inconclusive(Exception):
+    """读入的开头部分不足以判断格式（元素或键值超出 SNIFF_BYTES）"""
+
+
+def _json_format_of(data: Any) -> Optional[str]:
+    if isinstance(data, list):
+        first = data[0] if data else None
+        return "content_list" if isinstance(first, dict) and "page_idx" in first else None
+    if isinstance(data, dict) and "pdf_info" in data:
+        return "pdf_info"
+    return None
+
+
+def _sniff_object_keys(head: str, truncated: bool) -> Optional[str]:
+    # 逐个解码顶层键，跳过其值，直到遇到 pdf_info 或对象结束
+    decoder = json.JSONDecoder()
+    pos = 1
+    while True:
+        try:
+            while head[pos] in _WS:
+                pos += 1
+            if head[pos] == "}":
+                return None
+            key, pos = decoder.raw_decode(head, pos)
+            while head[pos] in _WS:
+                pos += 1
+            if not isinstance(key, str) or head[pos] != ":":
+                return None
+            if key == "pdf_info":
+                return "pdf_info"
+            pos += 1
+            while head[pos] in _WS:
+                pos += 1
+            _, pos = decoder.raw_decode(head, pos)
+            while head[pos] in _WS:
+                pos += 1
+            # "}" 表示对象结束且未见 pdf_info
+            if head[pos] != ",":
+                return None
+            pos += 1
+        except (ValueError, IndexError):
+            if truncated:
+                raise _Inconclusive()
+            return None
+
+
+def _sniff_json_format(path: Path) -> Optional[str]:
+    """
+    优先只读文件开头判断格式：
+    - 'content_list'：顶层为数组且首元素含 page_idx（MinerU 标准格式）
+    - 'pdf_info'：顶层为对象且含 pdf_info 键（按顶层键逐个解码，不匹配嵌套值中的同名字符串）
+    开头部分不足以判断时（如首元素大于 SNIFF_BYTES）回退为整文件解析。
+    """
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            head = f.read(SNIFF_BYTES)
+            truncated = bool(f.read(1))
+    except (OSError, UnicodeDecodeError):
+        return None
+    head = head.lstrip(_WS)
+    try:
+        if head.startswith("["):
+            try:
+                first = next(_iter_json_array_text(head, complete=not truncated), None)
+            except ValueError:
+                return None
+            if first is None and truncated:
+                raise _Inconclusive()
+            return _json_format_of([first] if first is not None else [])
+        if head.startswith("{"):
+            return _sniff_object_keys(head, truncated)
+        return None
+    except _Inconclusive:
+        logger.info(f"{path.name} 开头 {SNIFF_BYTES} 字符不足以判断格式，整文件解析")
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            return _json_format_of(json.load(f))
+    except (OSError, ValueError) as e:
+        logger.warning(f"解析 {path.name} 失败: {e}")
+        return None
+
+
+def _iter_json_array_text(text: str, complete: bool = True) -> Iterator[Any]:
+    # 在已读入的文本上逐个解码数组元素；complete=False 时遇到截断的元素即停止
+    decoder = json.JSONDecoder()
+    pos = text.index("[") + 1
+    while True:
+        while pos < len(text) and text[pos] in _WS + ",":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            return
+        try:
+            obj, pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            if complete:
+                raise
+            return
+        yield obj
+
+
+def _iter_json_array(path: Path, block_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    增量解析顶层 JSON 数组：按块读入，用 raw_decode 逐个解出元素，
+    只保留分块所需字段；缓冲区只保留尚未解码的尾部。
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        buf = f.read(block_size).lstrip(_WS)
+        if not buf.startswith("["):
+            raise ValueError(f"{path.name} 顶层不是数组")
+        pos = 1
+        eof = False
+        while True:
+            while pos < len(buf) and buf[pos] in _WS + ",":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            obj = None
+            if pos < len(buf):
+                try:
+                    obj, pos = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                    obj = None
+            if obj is None:
+                if eof:
+                    raise ValueError(f"{path.name} 数组未闭合")
+                block = f.read(block_size)
+                eof = not block
+                buf = buf[pos:] + block
+                pos = 0
+                continue
+            if isinstance(obj, dict):
+                yield {k: obj[k] for k in _CONTENT_FIELDS if k in obj}
+            else:
+                yield obj
+
+
 class ParentChildChunker:
-    def __init__(self, child_size: int = 400, overlap: int = 50):
-        # 字符数估算：中文/英文混合，400 char 约等于 200 tokens
+    def __init__(
+        self,
+        child_size: int = 400,
+        overlap: int = 50,
+        child_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None,
+        header_footer_threshold: Optional[float] = None,
+        near_dup_distance: int = 0,
+    ):
+        # 字符模式：child_size/overlap 为字符数（中英混合时 token 数差异可达数倍）
         self.child_size = child_size
         self.overlap = overlap
+        # token 模式：设置 child_tokens 后按本地估算的 token 数切分，overlap_tokens 为回退量
+        self.child_tokens = child_tokens
+        self.overlap_tokens = overlap_tokens if overlap_tokens is not None else (child_tokens or 0) // 8
+        # 页眉页脚：出现在不少于该比例页面上的短行视为页眉/页脚/页码/版权行并剔除（None 关闭）
+        self.header_footer_threshold = header_footer_threshold
+        # 近重复 child：SimHash 汉明距离不超过该值的后出现者丢弃（0 关闭）
+        self.near_dup_distance = near_dup_distance
 
     def _sha(self, text: str) -> str:
         return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
     def _find_json_content(self, doc_dir: Path) -> List[Dict]:
-        """尝试找到并读取 MinerU 的 content_list.json"""
+        """
+        尝试找到并读取 MinerU 的 content_list.json
+
+        - 只读取每个候选文件开头若干字节判断格式，不再整文件解析去试探
+        - content_list 逐元素增量解析，只保留分块需要的字段
+        - 选中的文件与格式缓存在 doc 目录的 JSON_SOURCE_CACHE 中，文件未变时直接复用
+        """
+        cached = self._load_json_source_cache(doc_dir)
+        if cached is not None:
+            path, fmt = cached
+        else:
+            path, fmt = self._pick_json_source(doc_dir)
+            self._save_json_source_cache(doc_dir, path, fmt)
+        if path is None:
+            return []
+        try:
+            if fmt == "content_list":
+                return list(_iter_json_array(path))
+            # 某些版本可能包裹在 data 字段里
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("pdf_info", [])
+        except Exception as e:
+            logger.warning(f"读取 {path.name} 失败: {e}")
+            return []
+
+    def _pick_json_source(self, doc_dir: Path) -> tuple[Optional[Path], Optional[str]]:
         # 常见命名模式
         candidates = list(doc_dir.glob("*_content_list.json")) + \
                      list(doc_dir.glob("model.json")) + \
                      list(doc_dir.glob("*.json"))
-        
+        seen = set()
         for json_path in candidates:
-            if "manifest" in json_path.name: continue # 跳过 manifest
-            try:
-                data = json.loads(json_path.read_text(encoding='utf-8'))
-                # 检查是否是列表且包含 page_idx (MinerU 标准格式)
-                if isinstance(data, list) and len(data) > 0 and "page_idx" in data[0]:
-                    return data
-                # 某些版本可能包裹在 data 字段里
-                if isinstance(data, dict) and "pdf_info" in data:
-                     # 或者是 doc_layout_result
-                     return data.get("pdf_info", [])
-            except Exception:
+            if json_path in seen or json_path.name.startswith("."):
                 continue
-        return []
+            seen.add(json_path)
+            if "manifest" in json_path.name: continue # 跳过 manifest
+            fmt = _sniff_json_format(json_path)
+            if fmt:
+                return json_path, fmt
+        return None, None
 
-    def process_document(self, doc_dir: Path, doc_meta: Dict[str, Any]) -> tuple[List[Dict], List[Dict]]:
+    def _load_json_source_cache(self, doc_dir: Path) -> Optional[tuple[Optional[Path], Optional[str]]]:
+        cache_path = doc_dir / JSON_SOURCE_CACHE
+        if not cache_path.exists():
+            return None
+        try:
+            cache = json.loads(cache_path.read_text(encoding='utf-8'))
+        except Exception:
+            return None
+        if cache.get("version") != JSON_SOURCE_CACHE_VERSION or cache.get("listing") != _json_listing(doc_dir):
+            return None
+        name = cache.get("file")
+        return (doc_dir / name if name else None), cache.get("format")
+
+    def _save_json_source_cache(self, doc_dir: Path, path: Optional[Path], fmt: Optional[str]) -> None:
+        cache = {
+            "version": JSON_SOURCE_CACHE_VERSION,
+            "file": path.name if path else None,
+            "format": fmt,
+            "listing": _json_listing(doc_dir),
+        }
+        try:
+            (doc_dir / JSON_SOURCE_CACHE).write_text(json.dumps(cache, ensure_ascii=False), encoding='utf-8')
+        except OSError:
+            pass
+
+    def process_document(self, doc_dir: Path, doc_meta: Dict[str, Any]) -> tuple[List[Dict], List[ChunkRecord]]:
         """
         PR 2.5: 按页聚合 Parent，再切分 Child
         """
@@ -62,9 +322,41 @@ class ParentChildChunker:
                 text = md_files[0].read_text(encoding='utf-8')
                 parents, childs = self._chunk_fallback_text(doc_uid, text, doc_meta)
 
+        if self.near_dup_distance > 0 and childs:
+            kept = self._drop_near_duplicates(childs)
+            if len(kept) < len(childs):
+                logger.info(f"[{doc_uid}] 丢弃近重复 child {len(childs) - len(kept)} 条")
+            childs = kept
         return parents, childs
 
-    def _chunk_by_page_json(self, doc_uid: str, content_list: List[Dict], doc_meta: Dict) -> tuple[List[Dict], List[Dict]]:
+    def _drop_near_duplicates(self, childs: List[ChunkRecord]) -> List[ChunkRecord]:
+        index = NearDupIndex(self.near_dup_distance)
+        return [c for c in childs if not index.seen(c.text)]
+
+    def _repeated_lines(self, pages: Dict[int, List[str]]) -> set:
+        """
+        统计页首/页尾的各归一化短行出现在多少页上，返回达到阈值的行（数字归一为 #，故页码行也会命中）。
+        正文中间反复出现的短行（如图表来源说明）不计入。
+        """
+        if not self.header_footer_threshold or len(pages) < HEADER_FOOTER_MIN_PAGES:
+            return set()
+        counts: Dict[str, int] = {}
+        for texts in pages.values():
+            seen = set()
+            edges = _page_edge_lines(texts)
+            for ti, text in enumerate(texts):
+                for li, line in enumerate(text.splitlines()):
+                    if (ti, li) not in edges:
+                        continue
+                    key = _norm_line(line)
+                    if key and len(key) <= HEADER_FOOTER_MAX_LINE:
+                        seen.add(key)
+            for key in seen:
+                counts[key] = counts.get(key, 0) + 1
+        need = self.header_footer_threshold * len(pages)
+        return {k for k, n in counts.items() if n >= need}
+
+    def _chunk_by_page_json(self, doc_uid: str, content_list: List[Dict], doc_meta: Dict) -> tuple[List[Dict], List[ChunkRecord]]:
         """基于 MinerU JSON 的按页聚合逻辑"""
         # Group by page_idx
         pages = {}
@@ -82,11 +374,31 @@ class ParentChildChunker:
                 pages[pidx] = []
             pages[pidx].append(text)
 
+        # 剔除跨页重复的页眉/页脚/页码/版权行
+        repeated = self._repeated_lines(pages)
+        if repeated:
+            stripped = 0
+            for pidx, texts in pages.items():
+                kept = []
+                edges = _page_edge_lines(texts)
+                for ti, text in enumerate(texts):
+                    lines = text.splitlines()
+                    body = [
+                        ln for li, ln in enumerate(lines) if (ti, li) not in edges or _norm_line(ln) not in repeated
+                    ]
+                    stripped += len(lines) - len(body)
+                    if any(ln.strip() for ln in body):
+                        kept.append("\n".join(body))
+                pages[pidx] = kept
+            logger.info(f"[{doc_uid}] 剔除页眉页脚等重复行 {stripped} 行（{len(repeated)} 种）")
+
         parents = []
         childs = []
         
         sorted_pidxs = sorted(pages.keys())
         for pidx in sorted_pidxs:
+            if not pages[pidx]:
+                continue
             # 聚合一页的文本作为 Parent
             page_text = "\n".join(pages[pidx])
             parent_id = f"{doc_uid}:p{pidx:04d}"
@@ -108,7 +420,7 @@ class ParentChildChunker:
             
         return parents, childs
 
-    def _chunk_fallback_text(self, doc_uid: str, text: str, doc_meta: Dict) -> tuple[List[Dict], List[Dict]]:
+    def _chunk_fallback_text(self, doc_uid: str, text: str, doc_meta: Dict) -> tuple[List[Dict], List[ChunkRecord]]:
         """兜底：无页码信息的纯文本分块"""
         # 简单将全文切分为固定大小的 Parent (例如 2000 chars)
         parent_size = 2000
@@ -146,118 +458,362 @@ class ParentChildChunker:
             
         return parents, childs
 
-    def _split_text_smart(self, text: str, parent_id: str, doc_uid: str, doc_meta: Dict, page_index: Optional[int]) -> List[Dict]:
+    def _split_text_smart(self, text: str, parent_id: str, doc_uid: str, doc_meta: Dict, page_index: Optional[int]) -> List[ChunkRecord]:
         """
         智能切分 Child: 优先按段落(\n\n) -> 句子(。！？.) -> 强制字符截断
+
+        每个窗口的回看扫描长度不超过窗口长度，整页为线性时间；窗口覆盖到页尾后即停止。
+        token 模式下窗口终点由 token 前缀和二分确定，使每个 child 的估算 token 数不超过 child_tokens。
+        char_start/char_end 为 strip 后 chunk 在 parent_text 中的精确位置。
         """
         chunks = []
         
         start = 0
         text_len = len(text)
         c_idx = 0
+        prefix = token_prefix(text) if self.child_tokens else None
+        citable = doc_meta.get("citable", True)
+        source_type = doc_meta.get("source_type", "evidence")
         
         while start < text_len:
-            end = start + self.child_size
+            if prefix is None:
+                end = start + self.child_size
+            else:
+                end = int(prefix.searchsorted(prefix[start] + self.child_tokens, side="right")) - 1
+                end = max(end, start + 1)
             
             # 寻找最佳截断点 (Lookback)
             cut_point = end
             if cut_point < text_len:
-                # 优先级 1: 双换行 (段落)
-                last_para = text.rfind('\n\n', start, end)
-                # 优先级 2: 单换行
-                last_line = text.rfind('\n', start, end)
-                # 优先级 3: 句末标点
-                last_punct = -1
-                for p in ['. ', '。', '！', '!', '?', '？']:
-                    idx = text.rfind(p, start, end)
-                    if idx > last_punct:
-                        last_punct = idx + len(p)
-                
-                if last_para != -1 and (end - last_para) < self.child_size * 0.4:
-                    cut_point = last_para + 2
-                elif last_punct != -1 and (end - last_punct) < self.child_size * 0.4:
-                    cut_point = last_punct
-                elif last_line != -1 and (end - last_line) < self.child_size * 0.2:
-                    cut_point = last_line + 1
+                cut_point = self._cut_point(text, start, end)
             
             # 修正边界
             cut_point = min(cut_point, text_len)
             
             # 提取
-            chunk_text = text[start:cut_point].strip()
+            raw = text[start:cut_point]
+            chunk_text = raw.strip()
             
             if len(chunk_text) > 20: # 忽略太短的碎片
-                chunks.append({
-                    "chunk_id": f"{parent_id}:c{c_idx:02d}", # ID 包含 parent_id
-                    "parent_id": parent_id,
-                    "doc_uid": doc_uid,
-                    "text": chunk_text,
-                    "char_start": start,
-                    "char_end": start + len(chunk_text), # 近似，因为 strip 可能会变
-                    "page_index": page_index,
-                    "citable": doc_meta.get("citable", True),
-                    "source_type": doc_meta.get("source_type", "evidence"),
-                    "hash": self._sha(chunk_text)
-                })
+                # strip 后首字符在 raw 中的首次出现即为前导空白的长度（空白字符不会与之相等）
+                char_start = start + raw.find(chunk_text[0])
+                chunks.append(ChunkRecord(
+                    chunk_id=f"{parent_id}:c{c_idx:02d}", # ID 包含 parent_id
+                    parent_id=parent_id,
+                    doc_uid=doc_uid,
+                    text=chunk_text,
+                    char_start=char_start,
+                    char_end=char_start + len(chunk_text),
+                    page_index=page_index,
+                    citable=citable,
+                    source_type=source_type,
+                    hash=self._sha(chunk_text),
+                ))
                 c_idx += 1
             
+            if cut_point >= text_len:
+                # 窗口已覆盖到页尾：再步进只会产生页尾的重复后缀碎片
+                break
             # 滑动 (如果刚才没有完美截断，强制步进)
             if cut_point == start: # 防止死循环
-                start += self.child_size
-            else:
+                start = end
+            elif prefix is None:
                 # Overlap 处理：回退一部分
                 start = max(cut_point - self.overlap, start + 1)
+            else:
+                back = int(prefix.searchsorted(prefix[cut_point] - self.overlap_tokens, side="left"))
+                start = max(back, start + 1)
                 
         return chunks
 
-def run_chunking(parsed_dir: Path, chunks_dir: Path, meta_dir: Path):
-    chunker = ParentChildChunker()
+    def _cut_point(self, text: str, start: int, end: int) -> int:
+        """
+        在 [start, end) 内回看寻找截断点；找不到合适边界时返回 end
+
+        按优先级逐级查找，命中即返回。各级边界的最后一次出现不在窗口尾部时必然不被接受，
+        因此只扫描可被接受的尾部（标点多看 _PUNCT_MARGIN 个字符），结果与整窗扫描一致。
+        """
+        window = end - start
+        tail = max(start, int(end - window * 0.4))
+        # 优先级 1: 双换行 (段落)
+        last_para = text.rfind('\n\n', tail, end)
+        if last_para != -1 and (end - last_para) < window * 0.4:
+            return last_para + 2
+        # 优先级 2: 句末标点（保留原有的比较方式：idx 与已记录的结束位置比较）
+        last_punct = -1
+        lo = max(start, tail - _PUNCT_MARGIN)
+        for p in ['. ', '。', '！', '!', '?', '？']:
+            idx = text.rfind(p, lo, end)
+            if idx > last_punct:
+                last_punct = idx + len(p)
+        if last_punct != -1 and (end - last_punct) < window * 0.4:
+            return last_punct
+        # 优先级 3: 单换行
+        last_line = text.rfind('\n', max(start, int(end - window * 0.2)), end)
+        if last_line != -1 and (end - last_line) < window * 0.2:
+            return last_line + 1
+        return end
+
+
+def _default_doc_meta(doc_uid: str) -> Dict[str, Any]:
+    # 文档目录中没有记录时的兜底
+    return {
+        "doc_uid": doc_uid,
+        "citable": True,
+        "source_type": "evidence"
+    }
+
+
+def _chunk_one(doc_dir: Path, doc_meta: Dict[str, Any], params: Dict[str, Any]) -> tuple:
+    """单个文档的分块任务（可在子进程中执行）：返回 (parents, childs, bib_record, 耗时秒)"""
+    t0 = time.perf_counter()
+    chunker = ParentChildChunker(**params)
+    parents, childs = chunker.process_document(doc_dir, doc_meta)
+    # 书目索引：作者/年份/标题取自 meta 与前两页文本，供 align-citations 精确匹配
+    bib = build_bib_record(doc_meta, [p["parent_text"] for p in parents[:2]])
+    return parents, childs, bib, time.perf_counter() - t0
+
+
+def _resolve_workers(workers: Optional[int], n_docs: int) -> int:
+    # workers <= 0 或未设置时取 CPU 核数
+    if not workers or workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, n_docs))
+
+
+def _chunker_params(chunker: ParentChildChunker) -> Dict[str, Any]:
+    return {
+        "child_size": chunker.child_size,
+        "overlap": chunker.overlap,
+        "child_tokens": chunker.child_tokens,
+        "overlap_tokens": chunker.overlap_tokens,
+        "header_footer_threshold": chunker.header_footer_threshold,
+        "near_dup_distance": chunker.near_dup_distance,
+    }
+
+
+def _params_hash(chunker: ParentChildChunker) -> str:
+    return sha256_str(json.dumps(dict(_chunker_params(chunker), version=CHUNKER_VERSION), sort_keys=True))
+
+
+def _doc_fingerprint(doc_dir: Path, doc_meta: Dict[str, Any]) -> str:
+    """输入指纹：解析目录内各文件的 (相对路径, 大小, mtime) + 文档 meta 内容"""
+    h = hashlib.sha256()
+    for f in sorted(doc_dir.rglob("*")):
+        if f.is_file() and not f.name.startswith("."):
+            st = f.stat()
+            h.update(f"{f.relative_to(doc_dir).as_posix()}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+    h.update(json.dumps(doc_meta, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+_SHARD_SUFFIXES = (".parents.parquet", ".chunks.parquet", ".bib.json")
+
+
+def _shard_paths(shards_dir: Path, doc_uid: str) -> Dict[str, Path]:
+    return {
+        "parents": shards_dir / f"{doc_uid}.parents.parquet",
+        "chunks": shards_dir / f"{doc_uid}.chunks.parquet",
+        "bib": shards_dir / f"{doc_uid}.bib.json",
+    }
+
+
+def _shard_doc_uid(name: str) -> Optional[str]:
+    """分片文件名（含中断遗留的 .tmp）-> doc_uid；非分片文件返回 None"""
+    name = name[: -len(".tmp")] if name.endswith(".tmp") else name
+    for suffix in _SHARD_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return None
+
+
+@contextmanager
+def _atomic_open(path: Path, mode: str = 'w'):
+    """先写同目录临时文件，成功后 os.replace 原子替换；中途失败不会覆盖已有的完好文件"""
+    tmp = path.with_name(path.name + ".tmp")
+    kwargs = {} if 'b' in mode else {"encoding": "utf-8"}
+    f = open(tmp, mode, **kwargs)
+    try:
+        yield f
+        f.close()
+        os.replace(tmp, path)
+    except BaseException:
+        f.close()
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _write_json_atomic(path: Path, data: Dict[str, Any]) -> None:
+    with _atomic_open(path) as f:
+        f.write(json.dumps(data, indent=2, ensure_ascii=False))
+
+
+def _iter_chunk_results(jobs: List[tuple], n_workers: int) -> Iterator[tuple]:
+    """
+    按提交顺序逐个产出分块结果。进程池中在途任务数限制为 2*workers，
+    已完成但未写盘的结果不会在内存中堆积。
+    """
+    if n_workers <= 1:
+        for job in jobs:
+            yield job[0], _chunk_one(*job)
+        return
+    window = n_workers * 2
+    with ProcessPoolExecutor(max_workers=n_workers) as ex:
+        pending: deque = deque()
+        for job in jobs:
+            pending.append((job[0], ex.submit(_chunk_one, *job)))
+            if len(pending) >= window:
+                doc_dir, fut = pending.popleft()
+                yield doc_dir, fut.result()
+        while pending:
+            doc_dir, fut = pending.popleft()
+            yield doc_dir, fut.result()
+
+
+def run_chunking(
+    parsed_dir: Path,
+    chunks_dir: Path,
+    meta_dir: Path,
+    workers: Optional[int] = None,
+    full: bool = False,
+    child_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+    header_footer_threshold: Optional[float] = None,
+    near_dup_distance: int = 0,
+):
+    """
+    增量分块：每个文档的输出存为 chunks/shards/ 下的分片，shards/manifest.json 记录
+    (doc_uid, 输入指纹, 分块参数 hash)。仅重新分块新增/变化的文档，删除已移除文档的分片，
+    最后按 parsed/ 顺序拼接分片得到 parents.parquet / chunks.parquet
+    （列式存储见 chunk_store.py；JSONL 由 rag export-chunks 按需导出）。
+    文档元数据读自 meta/catalog.sqlite，各文档的 parent/child 数与书目记录写回该目录。
+    """
+    chunker = ParentChildChunker(
+        child_tokens=child_tokens,
+        overlap_tokens=overlap_tokens,
+        header_footer_threshold=header_footer_threshold,
+        near_dup_distance=near_dup_distance,
+    )
     ensure_dir(chunks_dir)
-    
-    all_parents = []
-    all_childs = []
-    
-    for doc_dir in parsed_dir.iterdir():
-        if not doc_dir.is_dir():
-            continue
-            
-        doc_uid = doc_dir.name
-        
-        # 读取文档元数据
-        doc_meta_file = meta_dir / f"{doc_uid}.json"
-        if doc_meta_file.exists():
-            with open(doc_meta_file, 'r', encoding='utf-8') as f:
-                doc_meta = json.load(f)
-        else:
-            # 兜底
-            doc_meta = {
-                "doc_uid": doc_uid, 
-                "citable": True, 
-                "source_type": "evidence"
-            }
+    shards_dir = chunks_dir / "shards"
+    ensure_dir(shards_dir)
+    shard_manifest_path = shards_dir / "manifest.json"
+    params_hash = _params_hash(chunker)
 
-        parents, childs = chunker.process_document(doc_dir, doc_meta)
-        all_parents.extend(parents)
-        all_childs.extend(childs)
+    shard_manifest: Dict[str, Any] = {}
+    if shard_manifest_path.exists() and not full:
+        try:
+            shard_manifest = read_json(shard_manifest_path)
+        except Exception as e:
+            logger.warning(f"分片清单损坏，将全量重新分块: {e}")
+    entries: Dict[str, Dict[str, Any]] = shard_manifest.get("docs", {})
+
+    doc_dirs = [d for d in parsed_dir.iterdir() if d.is_dir()]
+    current = {d.name for d in doc_dirs}
+
+    # 已移除的文档：删除分片。--full 或清单损坏时 entries 为空，因此同时按目录中的分片文件判断
+    removed_set = {uid for uid in entries if uid not in current}
+    for f in shards_dir.iterdir():
+        uid = _shard_doc_uid(f.name)
+        if uid is not None and uid not in current:
+            removed_set.add(uid)
+            f.unlink(missing_ok=True)
+    removed = sorted(removed_set)
+    for uid in removed:
+        for sp in _shard_paths(shards_dir, uid).values():
+            sp.unlink(missing_ok=True)
+        entries.pop(uid, None)
+    # 旧版 JSONL 分片已被列式分片取代
+    for legacy in shards_dir.glob("*.jsonl"):
+        legacy.unlink(missing_ok=True)
+
+    with DocCatalog(meta_dir) as catalog:
+        found = catalog.get_many(d.name for d in doc_dirs)
+    metas = {d.name: found.get(d.name) or _default_doc_meta(d.name) for d in doc_dirs}
+
+    todo = []
+    fingerprints = {}
+    for d in doc_dirs:
+        fp = _doc_fingerprint(d, metas[d.name])
+        fingerprints[d.name] = fp
+        entry = entries.get(d.name)
+        paths = _shard_paths(shards_dir, d.name)
+        if (
+            entry is None
+            or entry.get("fingerprint") != fp
+            or entry.get("params_hash") != params_hash
+            or not all(p.exists() for p in paths.values())
+        ):
+            todo.append(d)
+
+    n_workers = _resolve_workers(workers, len(todo))
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    jobs = [(d, metas[d.name], _chunker_params(chunker)) for d in todo]
+    # 纯 CPU 任务：多进程并行，按提交顺序逐个写出分片，保证 chunk 顺序与 ID 与串行一致；
+    # 内存占用以单个文档为上限
+    for n_done, (doc_dir, (parents, childs, bib, elapsed)) in enumerate(_iter_chunk_results(jobs, n_workers), 1):
+        uid = doc_dir.name
+        paths = _shard_paths(shards_dir, uid)
+        chunk_store.write_records(paths["parents"], parents, chunk_store.PARENT_SCHEMA)
+        chunk_store.write_records(paths["chunks"], childs, chunk_store.CHUNK_SCHEMA)
+        _write_json_atomic(paths["bib"], bib)
+        entries[uid] = {
+            "fingerprint": fingerprints[uid],
+            "params_hash": params_hash,
+            "parents": len(parents),
+            "chunks": len(childs),
+            "updated_at": now_ts(),
+        }
+        timings[uid] = round(elapsed, 3)
+        del parents, childs
+        if n_done % 50 == 0:
+            # 定期落盘分片清单：中断后重跑只需处理剩余文档
+            _write_json_atomic(shard_manifest_path, {"params_hash": params_hash, "docs": entries, "generated_at": now_ts()})
+    total_sec = time.perf_counter() - t0
+    slowest = sorted(timings.items(), key=lambda kv: kv[1], reverse=True)[:5]
+    logger.info(
+        f"分块: {len(doc_dirs)} 个文档，重新分块 {len(todo)}，复用 {len(doc_dirs) - len(todo)}，"
+        f"移除 {len(removed)}；workers={n_workers}，耗时 {total_sec:.1f}s"
+        + ("；最慢: " + ", ".join(f"{uid}={sec:.2f}s" for uid, sec in slowest) if slowest else "")
+    )
+    _write_json_atomic(shard_manifest_path, {"params_hash": params_hash, "docs": entries, "generated_at": now_ts()})
+
+    # 合并视图：按 parsed/ 顺序拼接分片
+    order = [d.name for d in doc_dirs]
+    chunk_store.concat_files(
+        chunk_store.parents_path(chunks_dir),
+        [_shard_paths(shards_dir, u)["parents"] for u in order],
+        chunk_store.PARENT_SCHEMA,
+    )
+    chunk_store.concat_files(
+        chunk_store.chunks_path(chunks_dir),
+        [_shard_paths(shards_dir, u)["chunks"] for u in order],
+        chunk_store.CHUNK_SCHEMA,
+    )
+    # 文档目录：分块统计与书目记录（align-citations 据此匹配作者-年份引用）
+    with DocCatalog(meta_dir) as catalog:
+        catalog.clear_chunk_stats(set(removed) | (set(catalog.chunked_doc_uids()) - set(order)))
+        catalog.set_chunk_stats(
+            (u, entries[u]["parents"], entries[u]["chunks"], read_json(_shard_paths(shards_dir, u)["bib"]))
+            for u in order
+        )
+
+    total_parents = sum(entries[u]["parents"] for u in order)
+    total_chunks = sum(entries[u]["chunks"] for u in order)
 
-    # 写入结果
-    parents_path = chunks_dir / "parents.jsonl"
-    chunks_path = chunks_dir / "chunks.jsonl"
-    
-    with open(parents_path, 'w', encoding='utf-8') as f:
-        for p in all_parents:
-            f.write(json.dumps(p, ensure_ascii=False) + "\n")
-            
-    with open(chunks_path, 'w', encoding='utf-8') as f:
-        for c in all_childs:
-            f.write(json.dumps(c, ensure_ascii=False) + "\n")
-            
     # 更新清单
     manifest = {
-        "documents": len(all_parents),
-        "chunks": len(all_childs),
+        "documents": total_parents,
+        "chunks": total_chunks,
+        "rechunked": len(todo),
+        "reused": len(doc_dirs) - len(todo),
+        "removed": len(removed),
+        "workers": n_workers,
+        "elapsed_sec": round(total_sec, 3),
+        "doc_timings_sec": timings,
         "generated_at": now_ts()
     }
-    write_json(chunks_dir / "chunk_manifest.json", manifest)
+    _write_json_atomic(chunks_dir / "chunk_manifest.json", manifest)
     
-    return len(all_childs)
\ No newline at end of file
+    return total_chunks
@@ -5,6 +5,7 @@ import json
 import sys
 import os
 import hashlib
+import unicodedata
 from pathlib import Path
 from typing import Optional, List
 from dotenv import load_dotenv
@@ -12,7 +13,7 @@ from dotenv import load_dotenv
 # 立即加载 .env 环境变量
 load_dotenv()
 
-from . import __version__
+from . import __version__, vertex_client
 from .config import load_config, save_default_config, config_hash, DEFAULT_CONFIG
 from .errors import RagError, ErrorCode
 from .logger import get_logger
@@ -159,6 +160,36 @@ def _sha(text: str) -> str:
     return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
 
+def _api_concurrency(cfg: dict) -> int:
+    # 所有 Vertex 调用共享 embedding.concurrency 作为并发上限
+    return max(1, int(cfg.get('embedding', {}).get('concurrency', 4)))
+
+
+def _open_vector_store(cfg: dict, create: bool = False):
+    """按 embedding 配置打开 index/lancedb 向量库，并先配置共享的 Vertex 调用层。create=True 时创建目录。"""
+    from .vector_store import VectorStore
+
+    db_dir = project_root() / cfg['paths']['index'] / "lancedb"
+    if create:
+        ensure_dir(db_dir)
+    emb_cfg = cfg.get('embedding', {})
+    vertex_client.configure(cfg)
+    return VectorStore(
+        db_dir,
+        model_name=emb_cfg.get('model', 'text-embedding-004'),
+        output_dimensionality=emb_cfg.get('output_dim'),
+        max_request_tokens=emb_cfg.get('max_request_tokens', 20000),
+    )
+
+
+def _progress_line(done: int, total: int, start: float) -> str:
+    import time
+    elapsed = max(time.time() - start, 1e-6)
+    rate = done / elapsed
+    eta_sec = (total - done) / rate if rate > 0 else 0
+    return f"进度: {done}/{total} | rate={rate:.2f}/s | ETA={eta_sec:.0f}s"
+
+
 def _print_filters_and_summary(records: List[dict]):
     # Applied filters fixed为 citable=true
     print("Applied filters: citable=true")
@@ -365,30 +396,32 @@ def cmd_parse(args):
                 return True
         return False
 
-    # 2.1 为每个待解析单元写入 doc 元数据（chunk 时会读取 meta/{doc_uid}.json）
+    # 2.1 为每个待解析单元写入 doc 元数据（chunk 时从文档目录 meta/catalog.sqlite 读取）
     # doc_uid 统一使用文件 sha256（与 MinerU 上传 data_id 对齐）
+    from .catalog import DocCatalog
     filtered_units = []
     skipped = 0
-    for unit in files_to_parse:
-        uid = hash_file(unit)
-        flags = _infer_doc_flags_for_split_part(unit) if unit.parent == temp_split_dir else _infer_doc_flags(unit)
-        doc_meta = {
-            "doc_uid": uid,
-            "citable": bool(flags.get("citable")),
-            "source_type": flags.get("source_type", "unknown"),
-            "raw_relpath": flags.get("raw_relpath"),
-        }
-        if "split_from" in flags:
-            doc_meta["split_from"] = flags.get("split_from")
-        if "page_range" in flags and flags.get("page_range") is not None:
-            doc_meta["page_range"] = flags.get("page_range")
-        # 始终写入/更新元数据，便于后续 chunk 使用
-        write_json(meta_path / f"{uid}.json", doc_meta)
-
-        if getattr(args, "resume", False) and _parsed_complete(uid):
-            skipped += 1
-            continue
-        filtered_units.append(unit)
+    with DocCatalog(meta_path) as catalog:
+        for unit in files_to_parse:
+            uid = hash_file(unit)
+            flags = _infer_doc_flags_for_split_part(unit) if unit.parent == temp_split_dir else _infer_doc_flags(unit)
+            doc_meta = {
+                "doc_uid": uid,
+                "citable": bool(flags.get("citable")),
+                "source_type": flags.get("source_type", "unknown"),
+                "raw_relpath": flags.get("raw_relpath"),
+            }
+            if "split_from" in flags:
+                doc_meta["split_from"] = flags.get("split_from")
+            if "page_range" in flags and flags.get("page_range") is not None:
+                doc_meta["page_range"] = flags.get("page_range")
+            # 始终写入/更新元数据，便于后续 chunk 使用
+            catalog.upsert(doc_meta)
+
+            if getattr(args, "resume", False) and _parsed_complete(uid):
+                skipped += 1
+                continue
+            filtered_units.append(unit)
 
     files_to_parse = filtered_units
 
@@ -409,7 +442,7 @@ def cmd_parse(args):
 @handle_exception
 def cmd_import_client(args):
     """
-    导入 MinerU 客户端本地转换输出（md）到 parsed/，并写入 meta/{doc_uid}.json。
+    导入 MinerU 客户端本地转换输出（md）到 parsed/，并写入文档目录 meta/catalog.sqlite。
     """
     _require_init()
     cfg = load_config(Path('config.yaml'))
@@ -443,25 +476,27 @@ def cmd_import_client(args):
         print(human_warn('未在 client_root 下发现 md 文件。'))
         return
 
+    from .catalog import DocCatalog
     imported = 0
-    for md in md_files:
-        if args.include and args.include not in md.name:
-            continue
-        doc_uid = hash_file(md)
-        flags = _infer_doc_flags(md)
-        doc_meta = {
-            "doc_uid": doc_uid,
-            "citable": bool(flags.get("citable")),
-            "source_type": flags.get("source_type", "unknown"),
-            "raw_relpath": flags.get("raw_relpath"),
-        }
-        write_json(meta_path / f"{doc_uid}.json", doc_meta)
-
-        out_dir = parsed_dir / doc_uid
-        ensure_dir(out_dir)
-        out_md = out_dir / "full.md"
-        out_md.write_text(md.read_text(encoding="utf-8"), encoding="utf-8")
-        imported += 1
+    with DocCatalog(meta_path) as catalog:
+        for md in md_files:
+            if args.include and args.include not in md.name:
+                continue
+            doc_uid = hash_file(md)
+            flags = _infer_doc_flags(md)
+            doc_meta = {
+                "doc_uid": doc_uid,
+                "citable": bool(flags.get("citable")),
+                "source_type": flags.get("source_type", "unknown"),
+                "raw_relpath": flags.get("raw_relpath"),
+            }
+            catalog.upsert(doc_meta)
+
+            out_dir = parsed_dir / doc_uid
+            ensure_dir(out_dir)
+            out_md = out_dir / "full.md"
+            out_md.write_text(md.read_text(encoding="utf-8"), encoding="utf-8")
+            imported += 1
 
     print(f'已导入 {imported} 个 md 到 parsed/（doc_uid=md 哈希）。')
 
@@ -495,11 +530,12 @@ def _instruction_assimilation(cfg: dict, raw_dir: Path):
 
 
 def _write_empty_chunk_outputs(chunks_dir: Path, cfg: dict):
-    parents = chunks_dir / 'parents.jsonl'
-    chunks = chunks_dir / 'chunks.jsonl'
+    from . import chunk_store
+    parents = chunk_store.parents_path(chunks_dir)
+    chunks = chunk_store.chunks_path(chunks_dir)
     manifest = chunks_dir / 'chunk_manifest.json'
-    parents.write_text('', encoding='utf-8')
-    chunks.write_text('', encoding='utf-8')
+    chunk_store.write_records(parents, [], chunk_store.PARENT_SCHEMA)
+    chunk_store.write_records(chunks, [], chunk_store.CHUNK_SCHEMA)
     write_json(
         manifest,
         {'documents': 0, 'chunks': 0, 'generated_at': now_ts(), 'parent_hashes': [], 'child_hashes': []},
@@ -520,7 +556,14 @@ def cmd_chunk(args):
     
     from .chunker import run_chunking
     logger.info("正在执行分块 (Parent-Child 策略)...")
-    count = run_chunking(parsed_dir, chunks_dir, meta_path)
+    chunk_cfg = cfg.get('chunking', {})
+    workers = args.workers if args.workers is not None else chunk_cfg.get('workers', 0)
+    count = run_chunking(
+        parsed_dir, chunks_dir, meta_path, workers=workers, full=args.full,
+        child_tokens=chunk_cfg.get('child_tokens'), overlap_tokens=chunk_cfg.get('overlap_tokens'),
+        header_footer_threshold=cfg.get('locator', {}).get('header_footer_repeat_threshold'),
+        near_dup_distance=int(chunk_cfg.get('near_dup_hamming', 8)),
+    )
     
     if count == 0:
         print(human_warn('未发现可分块的解析内容，请先执行 rag parse。'))
@@ -537,30 +580,18 @@ def cmd_embed(args):
     os.environ.setdefault("RAG_LOG_FILE", str(meta_dir(cfg) / "embed_run.log"))
     os.environ.setdefault("RAG_STATUS_FILE", str(meta_dir(cfg) / "embed_status.json"))
     get_logger()
-    root = project_root()
-    chunks_path = Path(cfg['paths']['chunks']) / 'chunks.jsonl'
-    if not chunks_path.exists():
-        _fail('未找到 chunks/chunks.jsonl，请先运行 rag chunk。', ErrorCode.EMBED_NO_CHUNKS)
+    from . import chunk_store
+    chunks_dir = Path(cfg['paths']['chunks'])
+    if not chunk_store.chunks_path(chunks_dir).exists():
+        _fail('未找到 chunks/chunks.parquet，请先运行 rag chunk。', ErrorCode.EMBED_NO_CHUNKS)
 
-    import json
-    chunks = []
-    with open(chunks_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            if line.strip():
-                chunks.append(json.loads(line))
+    chunks = chunk_store.load_chunks(chunks_dir)
 
     if not chunks:
-        print(human_warn('chunks.jsonl 为空，未生成向量。'))
+        print(human_warn('chunks.parquet 为空，未生成向量。'))
         return
 
-    from .vector_store import VectorStore
-    db_dir = root / cfg['paths']['index'] / "lancedb"
-    ensure_dir(db_dir)
-    
-    emb_cfg = cfg.get('embedding', {})
-    model_name = emb_cfg.get('model', 'text-embedding-004')
-    output_dim = emb_cfg.get('output_dim')
-    vs = VectorStore(db_dir, model_name=model_name, output_dimensionality=output_dim)
+    vs = _open_vector_store(cfg, create=True)
     logger.info(f"正在为 {len(chunks)} 条 chunk 生成向量并存入 LanceDB...")
     _open_log_tail_window(meta_dir(cfg) / "embed_run.log")
     vs.add_chunks(chunks)
@@ -597,11 +628,11 @@ def cmd_embed_one(args):
     os.environ.setdefault("RAG_STATUS_FILE", str(meta_dir(cfg) / "embed_status.json"))
     get_logger()
     root = project_root()
-    chunks_path = Path(cfg['paths']['chunks']) / 'chunks.jsonl'
-    if not chunks_path.exists():
-        _fail('未找到 chunks/chunks.jsonl，请先运行 rag chunk。', ErrorCode.EMBED_NO_CHUNKS)
+    from . import chunk_store
+    chunks_dir = Path(cfg['paths']['chunks'])
+    if not chunk_store.chunks_path(chunks_dir).exists():
+        _fail('未找到 chunks/chunks.parquet，请先运行 rag chunk。', ErrorCode.EMBED_NO_CHUNKS)
 
-    import json
     target_uid = args.doc_uid
     if args.first_evidence:
         # 选取 raw/evidence 下排序后的第一个文件作为目标
@@ -612,32 +643,20 @@ def cmd_embed_one(args):
         from .utils import hash_file
         target_uid = hash_file(srcs[0])
 
-    subset = []
-    with open(chunks_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                obj = json.loads(line)
-            except Exception:
-                continue
-            if obj.get('doc_uid') == target_uid:
-                subset.append(obj)
+    # 按 doc_uid 过滤：只解码命中行组
+    subset = chunk_store.load_chunks(chunks_dir, doc_uid=target_uid)
 
     if not subset:
         _fail(f'未找到 doc_uid={target_uid} 对应的 chunks。', ErrorCode.GENERAL)
 
-    from .vector_store import VectorStore
-    db_dir = root / cfg['paths']['index'] / "lancedb"
-    ensure_dir(db_dir)
-    emb_cfg = cfg.get('embedding', {})
-    model_name = emb_cfg.get('model', 'text-embedding-004')
-    output_dim = emb_cfg.get('output_dim')
-    vs = VectorStore(db_dir, model_name=model_name, output_dimensionality=output_dim)
+    vs = _open_vector_store(cfg, create=True)
     _open_log_tail_window(meta_dir(cfg) / "embed_run.log")
 
     print(f"embed-one doc_uid={target_uid} chunks={len(subset)}")
     vs.add_chunks(subset)
+    # 直接写入当前表而不生成新 build：清空检索缓存，避免继续返回写入前的结果
+    from .query_cache import QueryCache
+    QueryCache.clear(meta_dir(cfg))
     print("embed-one 完成。")
 
 
@@ -655,26 +674,70 @@ def cmd_build_bm25(args):
     print('已创建 bm25 占位说明文件。')
 
 
-def _retrieve_candidates(query_text: str, vs, judge, cfg: dict, extra_filter: Optional[str] = None) -> tuple[List[dict], List[str]]:
+def _retrieve_candidates(
+    query_text: str,
+    vs,
+    judge,
+    cfg: dict,
+    extra_filter: Optional[str] = None,
+    variants: Optional[List[str]] = None,
+    query_vectors: Optional[dict] = None,
+    cache=None,
+) -> tuple[List[dict], List[str]]:
     """
-    公共检索逻辑: Expand -> Multi-Search -> Dedup -> Rerank
+    公共检索逻辑: Expand -> Multi-Search -> Dedup -> Rerank -> MMR
     返回: (final_results, variants_used)
+
+    batch 模式可传入预先扩展好的 variants 与批量生成的 query_vectors（query -> vector），
+    以跳过本函数内的 LLM 扩展与嵌入调用。
+    传入 cache（QueryCache）时，同一 build 下的重复查询直接返回缓存结果。
     """
+    if cache is not None:
+        hit = cache.get(query_text, extra_filter)
+        if hit is not None:
+            return hit
+    final_results, variants = _retrieve_uncached(query_text, vs, judge, cfg, extra_filter, variants, query_vectors)
+    if cache is not None:
+        cache.put(query_text, extra_filter, final_results, variants)
+    return final_results, variants
+
+
+def _retrieve_uncached(
+    query_text: str,
+    vs,
+    judge,
+    cfg: dict,
+    extra_filter: Optional[str],
+    variants: Optional[List[str]],
+    query_vectors: Optional[dict],
+) -> tuple[List[dict], List[str]]:
     # 1. Query Expansion
-    logger.info(f"正在进行查询扩展: {query_text}")
-    variants = judge.expand_query(query_text)
+    if variants is None:
+        logger.info(f"正在进行查询扩展: {query_text}")
+        variants = judge.expand_query(query_text)
     queries = [query_text] + variants
     # logger.info(f"多路召回查询词: {queries}")
+    if query_vectors is None:
+        concurrency = int(cfg.get('embedding', {}).get('concurrency', 4))
+        query_vectors = dict(zip(queries, vs.embed_queries(queries, concurrency=concurrency)))
 
     # 构造过滤器
     base_filter = "citable = true"
     final_filter = f"{base_filter} AND {extra_filter}" if extra_filter else base_filter
 
     # 2. Retrieve & Dedup
+    # 原始问题的向量同时供 MMR 计算相关度
+    query_vector = query_vectors[query_text]
     candidate_map = {} 
-    for q in queries:
-        # 每路召回 candidate_k 条
-        res = vs.search(q, limit=cfg['rerank']['candidate_k'], filters=final_filter)
+    # 每路召回 candidate_k 条，多路检索共享表句柄并发执行
+    all_results = vs.search_many(
+        queries,
+        limit=cfg['rerank']['candidate_k'],
+        filters=final_filter,
+        query_vectors=[query_vectors[q] for q in queries],
+        concurrency=_api_concurrency(cfg),
+    )
+    for res in all_results:
         for r in res:
             cid = r.get("chunk_id")
             if cid and cid not in candidate_map:
@@ -690,59 +753,47 @@ def _retrieve_candidates(query_text: str, vs, judge, cfg: dict, extra_filter: Op
     final_results = candidates
     if cfg['rerank']['enabled']:
         final_results = vs.rerank(query_text, candidates, model=cfg['rerank']['model'])
-        
-    # Cut Top N
-    return final_results[:cfg['rerank']['top_n']], variants
 
+    # 4. MMR 多样化（复用候选向量，压缩同页 overlap / 近重复段落）
+    mmr_cfg = cfg['rerank'].get('mmr', {})
+    if mmr_cfg.get('enabled'):
+        from .mmr import mmr_select
+        return mmr_select(
+            query_vector,
+            final_results,
+            top_n=cfg['rerank']['top_n'],
+            lambda_mult=float(mmr_cfg.get('lambda', 0.7)),
+            collapse_parent=bool(mmr_cfg.get('collapse_parent', False)),
+            max_per_parent=int(mmr_cfg.get('max_per_parent', 1)),
+        ), variants
 
-@handle_exception
-def cmd_query(args):
-    _require_init()
-    cfg = load_config(Path('config.yaml'))
-    root = project_root()
-    meta_path = meta_dir(cfg)
-    
-    build_manifest_path = latest_build_manifest(meta_path)
-    if not build_manifest_path:
-        _fail('未找到任何 build，请先运行 rag embed。', ErrorCode.QUERY_NO_BUILD)
-
-    from .vector_store import VectorStore
-    from .judge import RagJudge
-    
-    db_dir = root / cfg['paths']['index'] / "lancedb"
-    emb_cfg = cfg.get('embedding', {})
-    model_name = emb_cfg.get('model', 'text-embedding-004')
-    output_dim = emb_cfg.get('output_dim')
-    vs = VectorStore(db_dir, model_name=model_name, output_dimensionality=output_dim)
-    judge = RagJudge()
+    # Cut Top N
+    return final_results[:cfg['rerank']['top_n']], variants
 
-    # 调用公共检索逻辑
-    final_results, variants = _retrieve_candidates(args.question, vs, judge, cfg)
 
-    if not final_results:
-        print(human_warn("未找到相关证据。"))
-        return
+def _load_parents_map(cfg: dict) -> dict:
+    from . import chunk_store
+    return chunk_store.load_parents_map(Path(cfg['paths']['chunks']))
 
-    # 回填 Parent 上下文
-    parents_file = Path(cfg['paths']['chunks']) / 'parents.jsonl'
-    parents_map = {}
-    if parents_file.exists():
-        with open(parents_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                p = json.loads(line)
-                parents_map[p['parent_id']] = p
 
-    # 生成 Evidence Pack
+def _write_evidence_pack(
+    cfg: dict,
+    build_id: str,
+    question: str,
+    final_results: List[dict],
+    variants: List[str],
+    parents_map: dict,
+) -> tuple[Path, str]:
+    """生成 Evidence Pack 并记录 query_run，返回 (pack 路径, query_id)。"""
     query_id = generate_query_id()
     out_dir = outputs_dir(cfg)
     ep_path = next_version_path(out_dir, 'evidence_pack')
-    
-    _print_filters_and_summary(final_results)
-    
+
     lines_out = [
         f"# Evidence Pack",
-        f"- build_id: {read_json(build_manifest_path)['build_id']}",
+        f"- build_id: {build_id}",
         f"- query_id: {query_id}",
+        f"- question: {question}",
         f"- LOCATOR_QUALITY: page",
         f"- Applied filters: citable=true",
         f"- Returned sources summary: count={len(final_results)}",
@@ -764,20 +815,182 @@ def cmd_query(args):
         lines_out.append('')
 
     ep_path.write_text('\n'.join(lines_out), encoding='utf-8')
-    
+
     run_record = {
         'query_id': query_id,
-        'q_raw': args.question,
+        'q_raw': question,
         'variants': variants,
         'returned': len(final_results),
+        'evidence_pack': str(ep_path),
         'timestamp': now_ts(),
     }
-    write_json(meta_path / 'query_runs' / f'{query_id}.json', run_record)
+    write_json(meta_dir(cfg) / 'query_runs' / f'{query_id}.json', run_record)
+    return ep_path, query_id
+
+
+@handle_exception
+def cmd_query(args):
+    _require_init()
+    cfg = load_config(Path('config.yaml'))
+    meta_path = meta_dir(cfg)
+
+    if not args.question and not args.batch:
+        _fail('请提供查询问题，或使用 --batch 指定问题列表文件。', ErrorCode.GENERAL)
     
+    build_manifest_path = latest_build_manifest(meta_path)
+    if not build_manifest_path:
+        _fail('未找到任何 build，请先运行 rag embed。', ErrorCode.QUERY_NO_BUILD)
+    build_id = read_json(build_manifest_path)['build_id']
+
+    from .query_cache import QueryCache
+    cache = None if args.no_cache else QueryCache.for_build(meta_path, build_id, cfg)
+
+    # 缓存命中时无需初始化 Vertex / LanceDB
+    if not args.batch and cache is not None:
+        hit = cache.get(args.question)
+        if hit is not None:
+            logger.info("query cache 命中，跳过扩展/检索。")
+            _emit_query_pack(cfg, build_id, args.question, *hit)
+            return
+
+    from .judge import RagJudge
+
+    vs = _open_vector_store(cfg)
+    judge = RagJudge(retry=cfg.get('embedding', {}).get('retry'))
+
+    if args.batch:
+        _query_batch(args, cfg, build_id, vs, judge, cache)
+        _log_llm_usage(judge)
+        return
+
+    # 调用公共检索逻辑
+    final_results, variants = _retrieve_candidates(args.question, vs, judge, cfg, cache=cache)
+    _emit_query_pack(cfg, build_id, args.question, final_results, variants)
+    _log_llm_usage(judge)
+
+
+def _emit_query_pack(cfg: dict, build_id: str, question: str, final_results: List[dict], variants: List[str]) -> None:
+    if not final_results:
+        print(human_warn("未找到相关证据。"))
+        return
+
+    # 回填 Parent 上下文 & 生成 Evidence Pack
+    _print_filters_and_summary(final_results)
+    ep_path, _ = _write_evidence_pack(cfg, build_id, question, final_results, variants, _load_parents_map(cfg))
     print(f'Evidence Pack 已生成：{ep_path}')
 
 
+def _md_cell(value) -> str:
+    """Markdown 表格单元格：转义 |，换行折叠为空格，避免破坏表格结构。"""
+    text = ' '.join(str(value if value is not None else '').split())
+    return text.replace('|', '\\|')
+
+
+def _query_batch(args, cfg: dict, build_id: str, vs, judge, cache=None) -> None:
+    """
+    批量检索：一次进程内处理问题列表。
+    1) 并发执行查询扩展  2) 原始问题+变体批量嵌入  3) 共享同一表句柄并发检索，完成一条写一条 pack
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    batch_file = Path(args.batch)
+    if not batch_file.exists():
+        _fail(f'未找到问题列表文件：{batch_file}', ErrorCode.GENERAL)
+    questions = []
+    for ln in batch_file.read_text(encoding='utf-8').splitlines():
+        q = ln.strip()
+        if q and not q.startswith('#'):
+            questions.append(q)
+    if not questions:
+        print(human_warn('问题列表为空。'))
+        return
+
+    workers = _api_concurrency(cfg)
+    logger.info(f"batch query: {len(questions)} 个问题，并发 {workers}")
+
+    parents_map = _load_parents_map(cfg)
+    entries: List[Optional[dict]] = [None] * len(questions)
+
+    # 缓存命中的问题直接出 pack，其余进入扩展/嵌入/检索流水线
+    pending: List[int] = []
+    for i, q in enumerate(questions):
+        hit = cache.get(q) if cache is not None else None
+        if hit is None:
+            pending.append(i)
+            continue
+        final_results, variants = hit
+        if not final_results:
+            entries[i] = {'question': q, 'pack': None, 'returned': 0, 'error': '未找到相关证据', 'cached': True}
+            continue
+        ep_path, query_id = _write_evidence_pack(cfg, build_id, q, final_results, variants, parents_map)
+        entries[i] = {'question': q, 'pack': ep_path, 'returned': len(final_results), 'query_id': query_id, 'cached': True}
+    if len(pending) < len(questions):
+        logger.info(f"batch query: 缓存命中 {len(questions) - len(pending)} 个问题。")
+
+    pending_questions = [questions[i] for i in pending]
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        variants_list = list(ex.map(judge.expand_query, pending_questions))
+
+    uniq_queries: List[str] = []
+    seen = set()
+    for q, variants in zip(pending_questions, variants_list):
+        for text in [q] + variants:
+            if text not in seen:
+                seen.add(text)
+                uniq_queries.append(text)
+    logger.info(f"batch query: 批量嵌入 {len(uniq_queries)} 条查询...")
+    query_vectors = dict(zip(uniq_queries, vs.embed_queries(uniq_queries, concurrency=workers)))
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = {
+            ex.submit(
+                _retrieve_candidates, questions[i], vs, judge, cfg,
+                variants=v, query_vectors=query_vectors, cache=cache,
+            ): i
+            for i, v in zip(pending, variants_list)
+        }
+        for done, fut in enumerate(as_completed(futures), len(questions) - len(pending) + 1):
+            i = futures[fut]
+            q = questions[i]
+            try:
+                final_results, variants = fut.result()
+            except Exception as e:
+                logger.error(f"batch query 失败: {q} ({e})")
+                entries[i] = {'question': q, 'pack': None, 'returned': 0, 'error': str(e)}
+                continue
+            if not final_results:
+                entries[i] = {'question': q, 'pack': None, 'returned': 0, 'error': '未找到相关证据'}
+                continue
+            # 在主线程写出，保证 vNNN 版本号分配无竞争
+            ep_path, query_id = _write_evidence_pack(cfg, build_id, q, final_results, variants, parents_map)
+            entries[i] = {'question': q, 'pack': ep_path, 'returned': len(final_results), 'query_id': query_id}
+            print(f'[{done}/{len(questions)}] Evidence Pack 已生成：{ep_path}', flush=True)
+
+    manifest_path = next_version_path(outputs_dir(cfg), 'evidence_batch')
+    lines = [
+        f"# Evidence Batch: {batch_file.name}",
+        f"- build_id: {build_id}",
+        f"- questions: {len(questions)}",
+        f"- packs: {sum(1 for e in entries if e and e['pack'])}",
+        "",
+        "| # | question | evidence_pack | returned | note |",
+        "|---|---|---|---:|---|",
+    ]
+    for i, e in enumerate(entries, 1):
+        pack = e['pack'].name if e['pack'] else ''
+        # error 只记录真实失败；缓存命中单独标注
+        note = '; '.join(n for n in (e.get('error'), 'cached' if e.get('cached') else None) if n)
+        lines.append(
+            f"| {i} | {_md_cell(e['question'])} | {_md_cell(pack)} | {e['returned']} | {_md_cell(note)} |"
+        )
+    manifest_path.write_text('\n'.join(lines), encoding='utf-8')
+    _write_version_log(cfg, manifest_path, 'create', 'query_batch')
+    print(f'批量检索完成，汇总清单：{manifest_path}')
+
+
 def _extract_claims(text: str) -> List[dict]:
+    """本地关键词启发式：逐句标记可能的强断言（召回优先，由 LLM 复核）。"""
+    import re
     keywords = {
         '因果': ['cause', 'causes', 'lead to', 'results in', '因为', '导致'],
         '比较': ['more than', 'less than', 'higher', 'lower', '更高', '更低'],
@@ -788,13 +1001,140 @@ def _extract_claims(text: str) -> List[dict]:
     }
     claims = []
     for line in text.splitlines():
-        for typ, kws in keywords.items():
-            if any(kw.lower() in line.lower() for kw in kws):
-                claims.append({'text': line.strip()[:200], 'type': typ})
-                break
+        for sent in re.split(r"(?<=[。！？!?])|(?<=\.)\s+", line):
+            low = sent.lower()
+            for typ, kws in keywords.items():
+                if any(kw.lower() in low for kw in kws):
+                    claims.append({'text': sent.strip()[:200], 'type': typ})
+                    break
     return claims
 
 
+def _split_paragraphs(text: str) -> List[tuple[int, str]]:
+    """按空行切段，返回 (段落起始偏移, 段落文本)。"""
+    import re
+    paras = []
+    for m in re.finditer(r"\S(?:.*?)(?=\n\s*\n|\Z)", text, flags=re.S):
+        paras.append((m.start(), m.group(0)))
+    return paras
+
+
+def _pack_audit_windows(windows: List[tuple[int, str]], max_chars: int) -> List[List[tuple[int, str]]]:
+    """把候选段落按顺序装箱，每次 LLM 调用不超过 max_chars 字符（单段超长时单独成批）。"""
+    batches: List[List[tuple[int, str]]] = []
+    cur: List[tuple[int, str]] = []
+    size = 0
+    for w in windows:
+        if cur and size + len(w[1]) > max_chars:
+            batches.append(cur)
+            cur, size = [], 0
+        cur.append(w)
+        size += len(w[1])
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+def _audit_draft(text: str, judge, cfg: dict, cache=None) -> tuple[List[dict], dict]:
+    """
+    预筛选 + 增量 + 并发审计：
+    1) 切段，本地启发式挑出含候选强断言的段落
+    2) 段落哈希命中缓存（meta/audit_cache.json）的直接复用，仅新增/修改的段落送 LLM
+    3) 待审段落按字符上限装箱，并发调用 audit_claims
+    4) 结果按原文位置排序合并；失败批次回退为启发式结果并计入统计（不写缓存）
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from .judge import AUDIT_PROMPT_VERSION
+
+    audit_cfg = cfg.get('audit', {})
+    max_chars = int(audit_cfg.get('max_chars_per_call', 6000))
+    paragraphs = _split_paragraphs(text)
+    if audit_cfg.get('prefilter', True):
+        windows = [(off, para) for off, para in paragraphs if _extract_claims(para)]
+    else:
+        windows = paragraphs
+
+    def _para_key(para: str) -> str:
+        return _sha(json.dumps([_sha(para), judge.model_name, AUDIT_PROMPT_VERSION]))
+
+    def _place(found: List[dict], off: int, para: str) -> List[dict]:
+        # 缓存中保存段内相对偏移，回填为全文偏移
+        return [dict(c, _offset=off + int(c.get('_rel', 0))) for c in found]
+
+    claims: List[dict] = []
+    pending: List[tuple[int, str]] = []
+    for off, para in windows:
+        hit = cache.get(_para_key(para)) if cache is not None else None
+        if hit is None:
+            pending.append((off, para))
+        else:
+            claims.extend(_place(hit, off, para))
+
+    batches = _pack_audit_windows(pending, max_chars)
+    stats = {
+        'paragraphs': len(paragraphs),
+        'windows': len(windows),
+        'cached': len(windows) - len(pending),
+        'calls': len(batches),
+        'failed_calls': 0,
+    }
+    logger.info(
+        f"audit: {len(paragraphs)} 段，候选 {len(windows)} 段（缓存命中 {stats['cached']}），分 {len(batches)} 次调用"
+    )
+
+    def _run(batch: List[tuple[int, str]]) -> tuple[List[dict], bool]:
+        chunk_text = "\n\n".join(para for _, para in batch)
+        try:
+            found = judge.audit_claims(chunk_text)
+        except Exception as e:
+            logger.error(f"audit: 段落 @{batch[0][0]} 起的批次审计失败，回退启发式结果: {e}")
+            return [
+                {'claim_text': c['text'], 'claim_type': c['type'], 'reason': 'LLM 审计失败，关键词启发式标记，请人工复核', '_offset': off}
+                for off, para in batch
+                for c in _extract_claims(para)
+            ], False
+        # 将每条断言归属到所在段落，按段落写缓存
+        per_para: List[List[dict]] = [[] for _ in batch]
+        unlocated: List[dict] = []
+        for c in found:
+            if not isinstance(c, dict):
+                continue
+            item = {
+                'claim_text': str(c.get('claim_text', '')),
+                'claim_type': str(c.get('claim_type', '')),
+                'reason': str(c.get('reason', '')),
+            }
+            probe = item['claim_text'][:40]
+            for j, (_, para) in enumerate(batch):
+                pos = para.find(probe) if probe else -1
+                if pos >= 0:
+                    item['_rel'] = pos
+                    per_para[j].append(item)
+                    break
+            else:
+                # 模型改写了原文，无法定位到段落：单独标记，不归入任何段落
+                unlocated.append(dict(item, unlocated=True, _offset=batch[0][0]))
+        out = []
+        for (off, para), found_here in zip(batch, per_para):
+            # 存在无法定位的断言时不写缓存，避免下次命中缓存时丢失这些断言
+            if cache is not None and not unlocated:
+                cache.put(_para_key(para), found_here)
+            out.extend(_place(found_here, off, para))
+        if unlocated:
+            logger.warning(f"audit: 段落 @{batch[0][0]} 起的批次有 {len(unlocated)} 条断言无法定位到原文，已标记 unlocated")
+        out.extend(unlocated)
+        return out, True
+
+    with ThreadPoolExecutor(max_workers=_api_concurrency(cfg)) as ex:
+        results = list(ex.map(_run, batches))
+    if cache is not None:
+        cache.save()
+    stats['failed_calls'] = sum(1 for _, ok in results if not ok)
+    claims.extend(c for part, _ in results for c in part)
+    claims.sort(key=lambda c: c['_offset'])
+    return claims, stats
+
+
 @handle_exception
 def cmd_audit(args):
     _require_init()
@@ -816,9 +1156,13 @@ def cmd_audit(args):
     # ----------------------------------------
 
     from .judge import RagJudge
+    from .kv_cache import JsonCache
     logger.info("正在调用 Gemini 执行语义审计 (法官模式)...")
-    judge = RagJudge()
-    claims = judge.audit_claims(text)
+    vertex_client.configure(cfg)
+    judge = RagJudge(retry=cfg.get('embedding', {}).get('retry'))
+    # 段落级缓存：草稿迭代时仅审计新增/修改的段落
+    cache = None if args.no_cache else JsonCache(meta_dir(cfg) / 'audit_cache.json')
+    claims, stats = _audit_draft(text, judge, cfg, cache)
     
     outputs = outputs_dir(cfg) / 'audits'
     ensure_dir(outputs)
@@ -831,19 +1175,26 @@ def cmd_audit(args):
         f"# Audit Report: {draft.name}",
         f"- **Net Word Count**: {word_count} words (excluding citation anchors)",
         f"- **Clean Copy**: `{clean_path.name}`",
+        f"- **Audited paragraphs**: {stats['windows']} / {stats['paragraphs']} "
+        f"(cached: {stats['cached']}, LLM calls: {stats['calls']})",
+    ]
+    if stats['failed_calls']:
+        lines.append(f"- **WARNING**: {stats['failed_calls']} 次审计调用失败，相关断言为启发式结果，请人工复核")
+    lines += [
         "",
         '| claim_id | claim_text | claim_type | status | suggested_action |',
         '|---|---|---|---|---|'
     ]
     for i, c in enumerate(claims, 1):
-        lines.append(f"| c{i:03d} | {c['claim_text']} | {c['claim_type']} | NEED | {c['reason']} |")
+        status = 'NEED (unlocated)' if c.get('unlocated') else 'NEED'
+        lines.append(f"| c{i:03d} | {c['claim_text']} | {c['claim_type']} | {status} | {c['reason']} |")
     
     lines.append("\n## 自然语言待办清单 (PR 15.4.2)")
     for i, c in enumerate(claims, 1):
         lines.append(f"{i}. **{c['claim_type']}**: {c['claim_text']} \n   - 建议：{c['reason']}")
     
     lines.append("\n## Sources used")
-    srcs = _sources_used_from_chunks()
+    srcs = _sources_used_from_chunks(cfg)
     if srcs:
         lines.extend([f"- {s}" for s in srcs])
     else:
@@ -851,6 +1202,7 @@ def cmd_audit(args):
         
     out_path.write_text('\n'.join(lines), encoding='utf-8')
     _write_version_log(cfg, out_path, 'create', 'audit_claims_api')
+    _log_llm_usage(judge)
     print(f'API 审计完成，报告已生成：{out_path}')
 
 
@@ -865,44 +1217,17 @@ def _extract_doc_ids(text: str) -> List[tuple]:
     return results
 
 
-def _doc_citable(chunks_file: Path, docid: str) -> bool:
-    for ln in chunks_file.read_text(encoding='utf-8').splitlines():
-        if not ln.strip():
-            continue
-        obj = json.loads(ln)
-        if obj.get('doc_uid') == docid:
-            return obj.get('citable', False)
-    return False
-
-
-def _sources_used_from_chunks() -> List[str]:
-    chunks_file = Path('chunks') / 'chunks.jsonl'
-    if not chunks_file.exists():
-        return []
-    ids = []
-    for ln in chunks_file.read_text(encoding='utf-8').splitlines():
-        if not ln.strip():
-            continue
-        try:
-            obj = json.loads(ln)
-            if obj.get('doc_uid') and obj.get('doc_uid') not in ids:
-                ids.append(obj['doc_uid'])
-        except Exception:
-            continue
-    return ids
-
-
-def _load_chunks(chunks_file: Path) -> List[dict]:
-    if not chunks_file.exists():
-        return []
-    data = []
-    for ln in chunks_file.read_text(encoding='utf-8').splitlines():
-        if ln.strip():
-            try:
-                data.append(json.loads(ln))
-            except Exception:
-                continue
-    return data
+def _sources_used_from_chunks(cfg: dict) -> List[str]:
+    """已分块文档的 doc_uid，按 chunks 中的文档顺序。"""
+    from . import chunk_store
+    from .catalog import DocCatalog
+    with DocCatalog(meta_dir(cfg)) as catalog:
+        uids = catalog.chunked_doc_uids()
+    if uids:
+        return uids
+    # 目录中尚无分块统计（引入目录前分块、之后未重新 chunk）时，只读 chunks 的 doc_uid 列
+    table = chunk_store.read_table(chunk_store.chunks_path(Path(cfg['paths']['chunks'])), columns=['doc_uid'])
+    return list(dict.fromkeys(table.column('doc_uid').to_pylist())) if table is not None else []
 
 
 @handle_exception
@@ -917,64 +1242,262 @@ def cmd_verify_citations(args):
         print(human_warn("未在草稿中发现任何引用标记 {#doc_uid}。"))
         return
 
-    from .vector_store import VectorStore
     from .judge import RagJudge
-    
-    db_dir = project_root() / cfg['paths']['index'] / "lancedb"
-    emb_cfg = cfg.get('embedding', {})
-    model_name = emb_cfg.get('model', 'text-embedding-004')
-    output_dim = emb_cfg.get('output_dim')
-    vs = VectorStore(db_dir, model_name=model_name, output_dimensionality=output_dim)
-    judge = RagJudge()
-
-    logger.info(f"正在核查 {len(doc_ids)} 处引用的支撑度 (Query Expansion + Multi-Search)...")
+    from .kv_cache import JsonCache
+
+    vs = _open_vector_store(cfg)
+    judge = RagJudge(retry=cfg.get('embedding', {}).get('retry'))
+    # 判定缓存：草稿小改后重跑，仅重新核查句子或证据发生变化的行
+    verdict_cache = None if args.no_cache else JsonCache(meta_dir(cfg) / 'verify_cache.json')
+
+    workers = _api_concurrency(cfg)
+    calibrate = bool(args.calibrate)
+
+    # 相同 (sentence, doc_uid) 只核查一次；再按 doc_uid 分组，每个文档只检索一次证据
+    pair_rows: dict = {}
+    for i, pair in enumerate(doc_ids):
+        pair_rows.setdefault(pair, []).append(i)
+    groups: dict = {}
+    for sent, docid in pair_rows:
+        groups.setdefault(docid, []).append(sent)
+    logger.info(
+        f"正在核查 {len(doc_ids)} 处引用的支撑度（去重后 {len(pair_rows)} 条，{len(groups)} 个文档，并发 {workers}）..."
+    )
 
     outputs = outputs_dir(cfg) / 'audits'
     ensure_dir(outputs)
     base = f"{draft.stem}_citations"
     out_path = next_version_path(outputs, base)
     
-    header = '| sentence_id | sentence_text | cited_doc | score | status | critique |\n|---|---|---|---|---|---|'
+    header = '| sentence_id | sentence_text | cited_doc | score | status | critique | tier |\n|---|---|---|---|---|---|---|'
+
+    # 不同文档的检索/生成并发重叠，结果按原顺序回填
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    import time
+
+    results: List[Optional[dict]] = [None] * len(doc_ids)
+    start = time.time()
+    rows_done = 0
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = {
+            ex.submit(_verify_doc_claims, docid, sents, vs, judge, cfg, verdict_cache, calibrate): docid
+            for docid, sents in groups.items()
+        }
+        for fut in as_completed(futures):
+            docid = futures[fut]
+            try:
+                verdicts = fut.result()
+            except Exception as e:
+                logger.error(f"verify-citations 文档 {docid} 核查失败: {e}")
+                err = {"support_score": 0.0, "status": "ERROR", "critique": f"核查失败: {e}", "tier": "-"}
+                verdicts = {s: err for s in groups[docid]}
+            for sent, result in verdicts.items():
+                for i in pair_rows[(sent, docid)]:
+                    results[i] = result
+                    rows_done += 1
+            print(_progress_line(rows_done, len(doc_ids), start), flush=True)
+
+    if verdict_cache is not None:
+        verdict_cache.save()
+
     rows = [header]
-    
-    for i, (sent, docid) in enumerate(doc_ids, 1):
-        # 使用多路召回在目标文档中搜索证据
-        # 限制范围：只在该 doc_uid 内搜索
-        candidates, _ = _retrieve_candidates(sent, vs, judge, cfg, extra_filter=f"doc_uid = '{docid}'")
-        
-        if not candidates:
-            # 如果连关键词都搜不到，那肯定是 MISSING
-            rows.append(f"| s{i:03d} | {sent[:100]}... | {docid} | 0.00 | MISSING | 未在文档中检索到相关片段 |")
-            continue
-            
-        evidence_texts = [c['text'] for c in candidates]
-        
-        # 调用 Gemini 进行语义比对
-        result = judge.verify_support(sent, evidence_texts)
-        
-        rows.append(f"| s{i:03d} | {sent[:100]}... | {docid} | {result['support_score']:.2f} | {result['status']} | {result['critique']} |")
+    tiers: dict = {}
+    for i, ((sent, docid), result) in enumerate(zip(doc_ids, results), 1):
+        tier = result.get('tier', '-')
+        tiers[tier] = tiers.get(tier, 0) + 1
+        rows.append(
+            f"| s{i:03d} | {sent[:100]}... | {docid} | {result['support_score']:.2f} | {result['status']} "
+            f"| {result['critique']} | {tier} |"
+        )
+    logger.info(f"verify-citations 判定来源: {json.dumps(tiers, ensure_ascii=False)}")
+    errors = sum(1 for r in results if r.get('status') == 'ERROR')
+    if errors:
+        print(human_warn(f'{errors} 行因 LLM 调用失败标记为 ERROR（未写入缓存），可稍后重跑'))
+    _log_llm_usage(judge)
+    if calibrate:
+        rows.extend(_calibration_report(results, cfg.get('verify_citations', {})))
 
     out_path.write_text('\n'.join(rows), encoding='utf-8')
     _write_version_log(cfg, out_path, 'create', 'verify_citations_api')
     print(f'引文核查完成，报告已生成：{out_path}')
 
 
+def _verdict_key(sent: str, docid: str, hit_hashes: List[str], evidence_mode: list, model_name: str) -> str:
+    """
+    判定缓存键：只取该断言自身的信息（规范化句子、doc_uid、该句命中 chunk 的 hash、证据组织方式、
+    判定模型与 prompt 版本），同文档其他断言的增删改不会使其失效。
+    """
+    from .judge import VERIFY_PROMPT_VERSION
+
+    norm = " ".join(unicodedata.normalize("NFKC", sent).split())
+    return _sha(json.dumps(
+        [_sha(norm), docid, _sha(json.dumps(hit_hashes)), evidence_mode, model_name, VERIFY_PROMPT_VERSION],
+        ensure_ascii=False,
+    ))
+
+
+def _verify_doc_claims(docid: str, sentences: List[str], vs, judge, cfg: dict, verdict_cache=None, calibrate: bool = False) -> dict:
+    """
+    核查同一文档的一组断言，返回 {sentence: verdict}。
+    每条断言只使用自己的检索结果作为证据，多条断言合并为一次判定调用以节省请求数。
+    """
+    from .evidence_select import select_evidence_sentences
+
+    vc_cfg = cfg.get('verify_citations', {})
+    batch_size = max(1, int(vc_cfg.get('batch_size', 8)))
+    # 分层核查：相似度高于 threshold_high 或低于 threshold_T 时直接由向量分数判定，仅中间带交给 LLM
+    fast_path = bool(vc_cfg.get('fast_path', True))
+    sentence_select = bool(vc_cfg.get('sentence_select', True))
+    evidence_budget = int(vc_cfg.get('evidence_token_budget', 1200))
+    evidence_mode = [sentence_select, evidence_budget if sentence_select else None]
+
+    sentence_info = _retrieve_doc_evidence(sentences, docid, vs, cfg)
+    verdicts = {}
+    todo = []
+    fast = {}
+    for sent in sentences:
+        if not sentence_info[sent]['hits']:
+            # 如果连关键词都搜不到，那肯定是 MISSING
+            verdicts[sent] = {"support_score": 0.0, "status": "MISSING", "critique": "未在文档中检索到相关片段", "tier": "-"}
+            continue
+        fast[sent] = _fast_verdict(sentence_info[sent]['best_sim'], vc_cfg) if fast_path else None
+        if fast[sent] is not None and not calibrate:
+            verdicts[sent] = fast[sent]
+        else:
+            todo.append(sent)
+
+    keys = {s: _verdict_key(s, docid, sentence_info[s]['hashes'], evidence_mode, judge.model_name) for s in todo}
+    pending = []
+    for sent in todo:
+        cached = verdict_cache.get(keys[sent]) if verdict_cache is not None else None
+        if cached is not None:
+            verdicts[sent] = dict(cached, tier="cache")
+        else:
+            pending.append(sent)
+
+    # 调用 Gemini 进行语义比对：同一文档的多条断言合并为一次结构化调用，各自附带自己的证据
+    for b in range(0, len(pending), batch_size):
+        part = pending[b : b + batch_size]
+        evidence = []
+        for sent in part:
+            hits = sentence_info[sent]['hits']
+            if sentence_select:
+                # 只发送与该断言最相关的证据句（带 chunk_id 出处），压缩 prompt
+                evidence.append(select_evidence_sentences([sent], hits, token_budget=evidence_budget))
+            else:
+                evidence.append([str(h.get('text', '')) for h in hits])
+        for sent, result in zip(part, judge.verify_support_batch(part, evidence)):
+            verdicts[sent] = dict(result, tier="llm")
+            if verdict_cache is not None and result.get('status') != 'ERROR':
+                verdict_cache.put(keys[sent], result)
+
+    if calibrate:
+        # 校准模式：所有行都走 LLM（或缓存的 LLM 判定），同时记录快速路径本应给出的结论
+        for sent in sentences:
+            verdicts[sent]['best_sim'] = sentence_info[sent]['best_sim']
+            if fast.get(sent) is not None:
+                verdicts[sent]['fast_status'] = fast[sent]['status']
+    return verdicts
+
+
+def _log_llm_usage(judge) -> None:
+    # 按调用类型输出 token 与延迟统计，便于排查慢调用与配额问题
+    for line in judge.usage_lines():
+        logger.info(f"LLM usage | {line}")
+
+
+def _fast_verdict(best_sim: Optional[float], vc_cfg: dict) -> Optional[dict]:
+    """仅凭向量相似度给出判定；落在中间带时返回 None（交给 LLM）。"""
+    if best_sim is None:
+        return None
+    floor = float(vc_cfg.get('threshold_T', 0.55))
+    high = float(vc_cfg.get('threshold_high', 0.8))
+    if best_sim >= high:
+        return {"support_score": best_sim, "status": "OK", "critique": f"向量相似度 {best_sim:.2f} ≥ {high}，快速判定", "tier": "fast"}
+    if best_sim < floor:
+        return {"support_score": best_sim, "status": "MISSING", "critique": f"向量相似度 {best_sim:.2f} < {floor}，快速判定", "tier": "fast"}
+    return None
+
+
+def _calibration_report(results: List[dict], vc_cfg: dict) -> List[str]:
+    """对比快速路径与完整 LLM 路径的判定一致性。"""
+    pairs = [(r['fast_status'], r['status'], r.get('best_sim')) for r in results if r.get('fast_status')]
+    lines = [
+        "",
+        "## Fast-path calibration",
+        f"- threshold_T (floor): {vc_cfg.get('threshold_T', 0.55)}; threshold_high: {vc_cfg.get('threshold_high', 0.8)}",
+        f"- rows decidable by fast path: {len(pairs)} / {len(results)}",
+    ]
+    if not pairs:
+        return lines
+    agree = sum(1 for f, l, _ in pairs if f == l)
+    lines.append(f"- agreement with LLM: {agree}/{len(pairs)} ({agree / len(pairs):.0%})")
+    lines += ["", "| fast_status | llm_status | rows | mean_similarity |", "|---|---|---:|---:|"]
+    confusion: dict = {}
+    for f, l, sim in pairs:
+        confusion.setdefault((f, l), []).append(sim or 0.0)
+    for (f, l), sims in sorted(confusion.items()):
+        lines.append(f"| {f} | {l} | {len(sims)} | {sum(sims) / len(sims):.3f} |")
+    return lines
+
+
+def _retrieve_doc_evidence(sentences: List[str], docid: str, vs, cfg: dict) -> dict:
+    """
+    为同一文档的多条断言批量检索证据：每条断言取 verify_citations.k 条，embedding 与检索各批量发出一次。
+    返回: {sentence: {'hits': 该句命中的 chunk, 'hashes': 命中 chunk 的 hash 列表, 'best_sim': 最高余弦相似度}}
+    """
+    vc_cfg = cfg.get('verify_citations', {})
+    k = int(vc_cfg.get('k', 10))
+    doc_filter = f"citable = true AND doc_uid = '{docid}'"
+    vectors = vs.embed_queries(sentences, concurrency=_api_concurrency(cfg))
+    per_sentence = vs.search_many(sentences, limit=k, filters=doc_filter, query_vectors=vectors, concurrency=_api_concurrency(cfg))
+    from .mmr import cosine_to_query
+    sentence_info = {}
+    for s, v, hits in zip(sentences, vectors, per_sentence):
+        vecs = [h.get('vector') for h in hits if h.get('vector') is not None]
+        sims = cosine_to_query(v, vecs) if vecs and len(vecs) == len(hits) else None
+        sentence_info[s] = {
+            'hits': hits,
+            'hashes': [h.get('hash') or h.get('chunk_id') or '' for h in hits],
+            'best_sim': float(sims.max()) if sims is not None and len(sims) else None,
+        }
+    return sentence_info
+
+
 @handle_exception
 def cmd_meta_set(args):
     _require_init()
     cfg = load_config(Path('config.yaml'))
-    meta_path = meta_dir(cfg)
-    doc_meta_file = meta_path / f"{args.doc_uid}.json"
-    if not doc_meta_file.exists():
-        _fail('未找到该 doc_uid 的元数据文件。', ErrorCode.META_DOC_NOT_FOUND)
-    data = read_json(doc_meta_file)
+    from .catalog import DocCatalog
+    fields = {}
     if args.accessed_at:
-        data['accessed_at'] = args.accessed_at
-    write_json(doc_meta_file, data)
-    _write_version_log(cfg, doc_meta_file, 'update', 'meta set')
+        fields['accessed_at'] = args.accessed_at
+    with DocCatalog(meta_dir(cfg)) as catalog:
+        if not catalog.update(args.doc_uid, **fields):
+            _fail('未在文档目录中找到该 doc_uid。', ErrorCode.META_DOC_NOT_FOUND)
+        catalog_path = catalog.path
+    _write_version_log(cfg, catalog_path, 'update', 'meta set')
     print(f'已更新元数据：{args.doc_uid}')
 
 
+@handle_exception
+def cmd_export_chunks(args):
+    """
+    将列式存储的 parents/chunks 导出为 JSONL（兼容依赖旧格式的外部脚本）。
+    """
+    _require_init()
+    cfg = load_config(Path('config.yaml'))
+    from . import chunk_store
+    chunks_dir = project_root() / cfg['paths']['chunks']
+    if not chunk_store.chunks_path(chunks_dir).exists():
+        _fail('未找到 chunks/chunks.parquet，请先运行 rag chunk。', ErrorCode.EMBED_NO_CHUNKS)
+    out_dir = Path(args.out) if args.out else chunks_dir
+    ensure_dir(out_dir)
+    n_parents = chunk_store.export_jsonl(chunk_store.parents_path(chunks_dir), out_dir / 'parents.jsonl')
+    n_chunks = chunk_store.export_jsonl(chunk_store.chunks_path(chunks_dir), out_dir / 'chunks.jsonl')
+    print(f'已导出 JSONL：{out_dir} (parents={n_parents}, chunks={n_chunks})')
+
+
 @handle_exception
 def cmd_export_used_sources(args):
     _require_init()
@@ -984,13 +1507,10 @@ def cmd_export_used_sources(args):
     for line in ep_path.read_text(encoding='utf-8').splitlines():
         if line.strip().startswith('- doc_uid:'):
             doc_ids.append(line.split(':')[1].strip())
-    # 加载 chunk 元数据以输出 source_type/citable
-    chunk_records = _load_chunks(Path(cfg['paths']['chunks']) / 'chunks.jsonl')
-    doc_meta = {}
-    for r in chunk_records:
-        uid = r.get('doc_uid')
-        if uid and uid not in doc_meta:
-            doc_meta[uid] = {'source_type': r.get('source_type', 'unknown'), 'citable': r.get('citable')}
+    # 从文档目录按 doc_uid 查询 source_type/citable
+    from .catalog import DocCatalog
+    with DocCatalog(meta_dir(cfg)) as catalog:
+        doc_meta = catalog.get_many(doc_ids)
 
     out_path = next_version_path(outputs_dir(cfg), 'used_sources')
     out_lines = ['# Sources used']
@@ -1021,15 +1541,11 @@ def cmd_align_citations(args):
 
     root = project_root()
     db_dir = root / cfg['paths']['index'] / "lancedb"
-    if not db_dir.exists():
-        _fail('未找到向量索引，请先运行 rag embed。', ErrorCode.QUERY_NO_INDEX)
 
-    from .vector_store import VectorStore
-
-    emb_cfg = cfg.get('embedding', {})
-    model_name = emb_cfg.get('model', 'text-embedding-004')
-    output_dim = emb_cfg.get('output_dim')
-    vs = VectorStore(db_dir, model_name=model_name, output_dimensionality=output_dim)
+    from .bib_index import BibIndex
+    from .catalog import DocCatalog
+    with DocCatalog(meta_dir(cfg)) as catalog:
+        bib = BibIndex(catalog.bib_records())
     text = draft.read_text(encoding='utf-8')
     body, refs = split_body_and_references(text)
 
@@ -1067,16 +1583,39 @@ def cmd_align_citations(args):
     if args.max_queries and len(uniq_queries) > args.max_queries:
         uniq_queries = uniq_queries[: args.max_queries]
 
-    # 2) 对每个 query 执行检索，选择最可能的 doc_uid
+    # 2) 先查书目索引（作者-年份，纯内存），未命中的再回退到向量检索
     query_to_hit: Dict[str, Optional[dict]] = {}
+    misses: List[str] = []
     for q in uniq_queries:
+        hit = bib.lookup(q)
+        if hit:
+            hit['method'] = f"bib:{hit['match']}"
+            query_to_hit[q] = hit
+        else:
+            misses.append(q)
+    logger.info(f"align-citations: 书目索引命中 {len(uniq_queries) - len(misses)}/{len(uniq_queries)}")
+
+    if misses:
+        if not db_dir.exists():
+            _fail('未找到向量索引，请先运行 rag embed。', ErrorCode.QUERY_NO_INDEX)
+        vs = _open_vector_store(cfg)
         try:
-            recs = vs.search(q, limit=args.limit, filters="citable = true")
+            all_recs = vs.search_many(misses, limit=args.limit, filters="citable = true", concurrency=_api_concurrency(cfg))
         except Exception as e:
-            logger.error(f"align-citations: 检索失败: {q} ({e})")
-            recs = []
-        hit = recs[0] if recs else None
-        query_to_hit[q] = hit
+            # 批量失败时逐条重试，单条失败只影响该查询
+            logger.warning(f"align-citations: 批量检索失败，改为逐条检索 ({e})")
+            all_recs = []
+            for q in misses:
+                try:
+                    all_recs.append(vs.search(q, limit=args.limit, filters="citable = true"))
+                except Exception as qe:
+                    logger.error(f"align-citations: 检索失败 '{q}' ({qe})")
+                    all_recs.append([])
+        for q, recs in zip(misses, all_recs):
+            hit = recs[0] if recs else None
+            if hit:
+                hit['method'] = 'vector'
+            query_to_hit[q] = hit
 
     # 3) 在正文插入锚点（从后往前插，避免 offset 失效）
     inserts: List[tuple[int, str]] = []
@@ -1121,8 +1660,8 @@ def cmd_align_citations(args):
         f"- mapped_queries: {sum(1 for q in uniq_queries if query_to_hit.get(q) and query_to_hit[q].get('doc_uid'))} / {len(uniq_queries)}",
         f"- mapped_anchors_inserted: {mapped}",
         "",
-        "| query | doc_uid | source_type | score | snippet |",
-        "|---|---|---|---:|---|",
+        "| query | doc_uid | source_type | method | score | snippet |",
+        "|---|---|---|---|---:|---|",
     ]
     for q in uniq_queries:
         hit = query_to_hit.get(q)
@@ -1131,9 +1670,11 @@ def cmd_align_citations(args):
             snippet = str(hit.get("text", "")).strip().replace("\n", " ")
             if len(snippet) > 180:
                 snippet = snippet[:180] + "…"
-            rows.append(f"| {q} | {hit.get('doc_uid')} | {hit.get('source_type', '')} | {score} | {snippet} |")
+            rows.append(
+                f"| {q} | {hit.get('doc_uid')} | {hit.get('source_type', '')} | {hit.get('method', '')} | {score} | {snippet} |"
+            )
         else:
-            rows.append(f"| {q} |  |  |  |  |")
+            rows.append(f"| {q} |  |  |  |  |  |")
 
     if not args.dry_run:
         report.write_text("\n".join(rows), encoding="utf-8")
@@ -1163,19 +1704,28 @@ def build_parser() -> argparse.ArgumentParser:
     parse_p.add_argument('--max-units', type=int, default=None, help='最多处理的解析单元数（拆分后）')
     parse_p.add_argument('--resume', action='store_true', help='跳过已完成解析的文件单元')
 
-    sub.add_parser('chunk', help='生成 parent/child chunks')
+    chunk_p = sub.add_parser('chunk', help='生成 parent/child chunks')
+    chunk_p.add_argument('--workers', type=int, default=None, help='并行分块进程数（默认取 chunking.workers，0 为 CPU 核数）')
+    chunk_p.add_argument('--full', action='store_true', help='忽略分片清单，全部文档重新分块')
+    export_chunks = sub.add_parser('export-chunks', help='将 parents/chunks 导出为 JSONL')
+    export_chunks.add_argument('--out', required=False, help='输出目录（默认 chunks/）')
     sub.add_parser('embed', help='生成向量并写 build manifest')
     sub.add_parser('build-bm25', help='BM25 占位实现')
 
     query_p = sub.add_parser('query', help='检索并生成 Evidence Pack')
-    query_p.add_argument('question')
+    query_p.add_argument('question', nargs='?')
+    query_p.add_argument('--batch', required=False, help='问题列表文件（每行一个问题，# 开头为注释）')
+    query_p.add_argument('--no-cache', action='store_true', help='跳过 build 级检索结果缓存')
     query_p.add_argument('--mode', choices=['evidence', 'papers'], default='evidence')
 
     audit_p = sub.add_parser('audit', help='审计草稿中的强断言')
     audit_p.add_argument('draft_path')
+    audit_p.add_argument('--no-cache', action='store_true', help='忽略段落审计缓存，全文重新审计')
 
     verify_p = sub.add_parser('verify-citations', help='核查 draft 引用支撑度')
     verify_p.add_argument('draft_path')
+    verify_p.add_argument('--no-cache', action='store_true', help='忽略判定缓存，全部重新核查')
+    verify_p.add_argument('--calibrate', action='store_true', help='全部走 LLM，并报告快速路径与 LLM 判定的一致性')
 
     embed_one = sub.add_parser('embed-one', help='仅嵌入单个 doc_uid 的 chunks（最小验证）')
     embed_one.add_argument('--doc-uid', required=False, help='目标 doc_uid')
@@ -1214,6 +1764,8 @@ def main(argv: Optional[List[str]] = None):
         cmd_parse(args)
     elif args.command == 'chunk':
         cmd_chunk(args)
+    elif args.command == 'export-chunks':
+        cmd_export_chunks(args)
     elif args.command == 'embed':
         cmd_embed(args)
     elif args.command == 'embed-one':
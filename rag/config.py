@@ -27,6 +27,7 @@ DEFAULT_CONFIG = {
         "task_type_query": "RETRIEVAL_QUERY",
         "concurrency": 4,
         "timeout_seconds": 30,
+        "max_request_tokens": 20000,
         "retry": {"max_attempts": 3, "backoff_seconds": 2},
     },
     "rerank": {
@@ -34,8 +35,20 @@ DEFAULT_CONFIG = {
         "model": "semantic-ranker-default-004",
         "candidate_k": 50,
         "top_n": 10,
+        "mmr": {"enabled": True, "lambda": 0.7, "collapse_parent": False, "max_per_parent": 1},
     },
-    "verify_citations": {"k": 10, "threshold_T": 0.55},
+    "judge": {"timeout_seconds": 120},
+    "verify_citations": {
+        "k": 10,
+        "threshold_T": 0.55,
+        "threshold_high": 0.8,
+        "fast_path": True,
+        "batch_size": 8,
+        "sentence_select": True,
+        "evidence_token_budget": 1200,
+    },
+    "audit": {"prefilter": True, "max_chars_per_call": 6000},
+    "chunking": {"workers": 0, "child_tokens": 200, "overlap_tokens": 25, "near_dup_hamming": 8},
     "counterevidence_mode": "off",
     "locator": {"header_footer_repeat_threshold": 0.6},
 }
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import re
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .tokens import estimate_tokens
+
+# 候选句界：中文/感叹/问号、后接空白的句点、换行；句点是否断句再经 _is_abbreviation 判断
+_SENT_BOUNDARY_RE = re.compile(r"[。！？!?]|\.(?=\s|$)|\n+")
+_WORD_BEFORE_DOT_RE = re.compile(r"([A-Za-z][A-Za-z.]*)$")
+# 句点后不应断句的常见缩写（小写、去掉末尾句点）；数字中的小数点不会被视为句界
+_ABBREVIATIONS = frozenset({
+    "al", "cf", "ch", "dr", "e.g", "eq", "eqs", "fig", "figs", "i.e", "jr", "mr", "mrs", "ms",
+    "no", "nos", "p", "pp", "prof", "sec", "sr", "st", "tab", "viz", "vol", "vs",
+})
+_WORD_RE = re.compile(r"[A-Za-z0-9]+|[一-鿿]")
+_DIM = 4096
+
+
+def _is_abbreviation(text: str, dot: int) -> bool:
+    m = _WORD_BEFORE_DOT_RE.search(text, 0, dot)
+    if not m:
+        return False
+    word = m.group(1).lower()
+    # 单个字母视为姓名缩写（J. Smith）
+    return word in _ABBREVIATIONS or len(word) == 1
+
+
+def split_sentences(text: str) -> List[str]:
+    text = text or ""
+    parts: List[str] = []
+    start = 0
+    for m in _SENT_BOUNDARY_RE.finditer(text):
+        if m.group() == "." and _is_abbreviation(text, m.start()):
+            continue
+        parts.append(text[start : m.end()])
+        start = m.end()
+    parts.append(text[start:])
+    return [p.strip() for p in parts if len(p.strip()) > 1]
+
+
+def _terms(text: str) -> List[str]:
+    words = [w.lower() for w in _WORD_RE.findall(text)]
+    # 中文按字切分后补充相邻二元组，英文直接用词
+    bigrams = [a + b for a, b in zip(words, words[1:]) if len(a) == 1 and len(b) == 1]
+    return words + bigrams
+
+
+def _hashed_matrix(texts: List[str]) -> np.ndarray:
+    rows, cols = [], []
+    for i, t in enumerate(texts):
+        for term in _terms(t):
+            rows.append(i)
+            cols.append(zlib.crc32(term.encode("utf-8")) % _DIM)
+    mat = np.zeros((len(texts), _DIM), dtype=np.float32)
+    if rows:
+        np.add.at(mat, (np.asarray(rows), np.asarray(cols)), 1.0)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def select_evidence_sentences(
+    claims: List[str],
+    evidence: List[Dict],
+    token_budget: int = 1200,
+) -> List[str]:
+    """
+    从证据 chunk 中挑选与断言最相关的句子，控制在 token_budget 内。
+
+    - 证据即时切句，断言与句子用哈希词袋向量一次性算出相似度矩阵
+    - 多条断言时按各自排名轮转选取，保证每条断言都分到证据
+    - 返回按 chunk 分组的片段，形如 "[chunk_id] 句子1 … 句子2"，保留出处
+    """
+    units: List[Tuple[int, int, str]] = []  # (evidence_idx, sentence_idx, sentence)
+    for ei, rec in enumerate(evidence):
+        for si, sent in enumerate(split_sentences(str(rec.get("text", "")))):
+            units.append((ei, si, sent))
+    if not units or not claims:
+        return [str(rec.get("text", "")) for rec in evidence]
+
+    sims = _hashed_matrix(claims) @ _hashed_matrix([u[2] for u in units]).T
+    rankings = [list(np.argsort(-row, kind="stable")) for row in sims]
+
+    chosen = set()
+    used = 0
+    for rank in range(len(units)):
+        for ranking in rankings:
+            ui = int(ranking[rank])
+            if ui in chosen:
+                continue
+            cost = estimate_tokens(units[ui][2])
+            # 放不下的长句跳过，继续尝试排名靠后但更短的句子
+            if used + cost > token_budget and chosen:
+                continue
+            chosen.add(ui)
+            used += cost
+
+    by_chunk: Dict[int, List[Tuple[int, str]]] = {}
+    for ui in chosen:
+        ei, si, sent = units[ui]
+        by_chunk.setdefault(ei, []).append((si, sent))
+    out = []
+    for ei in sorted(by_chunk):
+        ref = evidence[ei].get("chunk_id") or f"e{ei}"
+        sents = [s for _, s in sorted(by_chunk[ei])]
+        out.append(f"[{ref}] " + " … ".join(sents))
+    return out
@@ -1,21 +1,115 @@
 import json
+import random
+import re
+import threading
+import time
 from typing import List, Dict, Any, Optional
-import vertexai
-from vertexai.generative_models import GenerativeModel
+from . import vertex_client
 from .logger import get_logger
-from .utils import get_google_project_id
 
 logger = get_logger()
 
+# verify 类 prompt 的版本号：修改 prompt 或证据组织方式时递增，以使旧的判定缓存失效
+VERIFY_PROMPT_VERSION = "verify-v3"
+AUDIT_PROMPT_VERSION = "audit-v1"
+
+_RETRYABLE_CODES = {429, 500, 502, 503, 504}
+_RETRYABLE_RE = re.compile(r"\b(?:429|500|502|503|504)\b")
+
+
+def _is_retryable(e: Exception) -> bool:
+    # 本地兜底超时说明调用仍占着调用池线程，立即重试只会加剧排队；SDK 返回的超时（504）仍可重试
+    if isinstance(e, vertex_client.CallTimeout):
+        return False
+    if isinstance(e, (TimeoutError, json.JSONDecodeError)):
+        return True
+    code = getattr(e, "code", None)
+    try:
+        if int(code) in _RETRYABLE_CODES:
+            return True
+    except (TypeError, ValueError):
+        pass
+    msg = str(e)
+    return bool(_RETRYABLE_RE.search(msg)) or "ResourceExhausted" in msg or "Unavailable" in msg
+
+
+def _parse_json(raw: str) -> Any:
+    # JSON 模式下模型直接返回 JSON；仍兼容被 Markdown 代码块包裹的输出
+    return json.loads(raw.strip().replace("```json", "").replace("```", "").strip())
+
+
 class RagJudge:
-    def __init__(self, project_id: Optional[str] = None, location: str = "us-central1"):
-        # 自动推断 Project ID
-        if not project_id:
-            project_id = get_google_project_id()
-            
-        # 初始化 Vertex AI
-        vertexai.init(project=project_id, location=location)
-        self.model = GenerativeModel("gemini-2.5-flash")
+    def __init__(
+        self,
+        project_id: Optional[str] = None,
+        location: Optional[str] = None,
+        retry: Optional[Dict[str, Any]] = None,
+    ):
+        # 共享客户端层：进程内只初始化一次 Vertex AI，模型句柄与 VectorStore 共用
+        vertex_client.init_vertex(project_id, location)
+        self.model_name = "gemini-2.5-flash"
+        self.model = vertex_client.generative_model(self.model_name)
+        retry = retry or {}
+        self.max_attempts = max(1, int(retry.get("max_attempts", 3)))
+        self.backoff_seconds = float(retry.get("backoff_seconds", 2))
+        self._stats_lock = threading.Lock()
+        self.usage: Dict[str, Dict[str, float]] = {}
+
+    def _json_config(self):
+        from vertexai.generative_models import GenerationConfig
+
+        return GenerationConfig(response_mime_type="application/json", temperature=0.0)
+
+    def _record(self, call_type: str, latency: float, response=None, retries: int = 0, failed: bool = False) -> None:
+        meta = getattr(response, "usage_metadata", None)
+        with self._stats_lock:
+            st = self.usage.setdefault(
+                call_type,
+                {"calls": 0, "failed": 0, "retries": 0, "prompt_tokens": 0, "output_tokens": 0, "latency_sec": 0.0},
+            )
+            st["calls"] += 1
+            st["failed"] += int(failed)
+            st["retries"] += retries
+            st["latency_sec"] += latency
+            if meta is not None:
+                st["prompt_tokens"] += int(getattr(meta, "prompt_token_count", 0) or 0)
+                st["output_tokens"] += int(getattr(meta, "candidates_token_count", 0) or 0)
+
+    def _generate_json(self, prompt: str, call_type: str) -> Any:
+        """
+        结构化 JSON 调用：共享调用池限流 + 单次调用超时，429/5xx/超时/JSON 损坏时抖动退避重试。
+        重试耗尽后抛出最后一次异常，由调用方决定 ERROR 或回退。
+        """
+        start = time.time()
+        last_err: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            response = None
+            try:
+                response = vertex_client.generate_content(self.model, prompt, generation_config=self._json_config())
+                result = _parse_json(response.text)
+                self._record(call_type, time.time() - start, response, retries=attempt)
+                return result
+            except Exception as e:
+                last_err = e
+                if attempt + 1 >= self.max_attempts or not _is_retryable(e):
+                    break
+                wait = self.backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"{call_type} 调用重试 {attempt + 1}/{self.max_attempts - 1}，{wait:.1f}s 后: {e}")
+                time.sleep(wait)
+        self._record(call_type, time.time() - start, retries=attempt, failed=True)
+        raise last_err
+
+    def usage_lines(self) -> List[str]:
+        """按调用类型汇总的次数、失败、重试、token 与平均延迟。"""
+        lines = []
+        with self._stats_lock:
+            for call_type, st in sorted(self.usage.items()):
+                avg = st["latency_sec"] / st["calls"] if st["calls"] else 0.0
+                lines.append(
+                    f"{call_type}: calls={st['calls']} failed={st['failed']} retries={st['retries']} "
+                    f"prompt_tokens={st['prompt_tokens']} output_tokens={st['output_tokens']} avg_latency={avg:.2f}s"
+                )
+        return lines
 
     def audit_claims(self, text: str) -> List[Dict[str, Any]]:
         """
@@ -34,45 +128,71 @@ class RagJudge:
         {text}
         """
         
-        try:
-            response = self.model.generate_content(prompt)
-            # 清理 Markdown 代码块包裹
-            raw_text = response.text.strip().replace("```json", "").replace("```", "")
-            return json.loads(raw_text)
-        except Exception as e:
-            logger.error(f"解析 Audit 结果失败: {e}")
-            return []
+        # 失败时抛出异常，由调用方决定回退策略（避免长文审计静默返回空结果）
+        claims = self._generate_json(prompt, "audit")
+        if not isinstance(claims, list):
+            raise ValueError(f"Audit 结果不是 JSON 数组: {str(claims)[:200]}")
+        return claims
 
     def verify_support(self, sentence: str, evidence_texts: List[str]) -> Dict[str, Any]:
         """
         执行 PR 15.4.3 的语义支撑度校验
-        返回 support_score (0.0 - 1.0) 和 status
+        返回 support_score (0.0 - 1.0) 和 status；与批量核查共用同一 prompt 与解析逻辑
+        """
+        return self.verify_support_batch([sentence], [evidence_texts])[0]
+
+    def verify_support_batch(self, sentences: List[str], evidence: List[List[str]]) -> List[Dict[str, Any]]:
+        """
+        同一文档的多条断言合并为一次调用，每条断言只对照自己的证据（evidence[i] 对应 sentences[i]）
+        返回列表与 sentences 一一对应
         """
-        context = "\n---\n".join(evidence_texts)
+        blocks = []
+        for i, (s, texts) in enumerate(zip(sentences, evidence), 1):
+            context = "\n---\n".join(texts) if texts else "（无）"
+            blocks.append(f"断言 {i}：{s}\n断言 {i} 的原文证据（方括号内为出处 chunk_id）：\n{context}")
+        claims = "\n\n".join(blocks)
         prompt = f"""
         你是一个学术事实核查员。
-        请对比“学生断言”与“原文证据”，判定证据是否能够支撑断言。
-        
-        学生断言：{sentence}
+        请逐条对比“学生断言”与其后附的“原文证据”，判定证据是否能够支撑该条断言。
+        每条断言只依据它自己的证据判定，不要参考其他断言的证据。
         
-        原文证据：
-        {context}
+        {claims}
         
-        请严格按以下 JSON 格式返回：
-        {{
-            "support_score": 0.0到1.0之间的浮点数,
-            "status": "OK" 或 "WEAK" 或 "MISSING",
-            "critique": "简短的评价，说明为什么支撑或不支撑"
-        }}
+        请严格按以下 JSON 数组格式返回，每条断言一个对象，id 为断言编号：
+        [
+            {{
+                "id": 1,
+                "support_score": 0.0到1.0之间的浮点数,
+                "status": "OK" 或 "WEAK" 或 "MISSING",
+                "critique": "简短的评价，说明为什么支撑或不支撑"
+            }}
+        ]
         """
-        
+
         try:
-            response = self.model.generate_content(prompt)
-            raw_text = response.text.strip().replace("```json", "").replace("```", "")
-            return json.loads(raw_text)
+            items = self._generate_json(prompt, "verify_batch")
         except Exception as e:
-            logger.error(f"解析 Verify 结果失败: {e}")
-            return {"support_score": 0.0, "status": "MISSING", "critique": f"API 解析失败: {e}"}
+            logger.error(f"解析 Verify 批量结果失败: {e}")
+            return [{"support_score": 0.0, "status": "ERROR", "critique": f"API 解析失败: {e}"} for _ in sentences]
+
+        by_id = {}
+        for item in items if isinstance(items, list) else []:
+            try:
+                by_id[int(item.get("id"))] = item
+            except Exception:
+                continue
+        results = []
+        for i in range(1, len(sentences) + 1):
+            item = by_id.get(i)
+            if item is None:
+                results.append({"support_score": 0.0, "status": "ERROR", "critique": "模型未返回该断言的判定"})
+                continue
+            results.append({
+                "support_score": float(item.get("support_score", 0.0) or 0.0),
+                "status": str(item.get("status", "MISSING")),
+                "critique": str(item.get("critique", "")),
+            })
+        return results
 
     def expand_query(self, text: str) -> List[str]:
         """
@@ -95,9 +215,7 @@ class RagJudge:
         你的输出：
         """
         try:
-            response = self.model.generate_content(prompt)
-            raw = response.text.strip().replace("```json", "").replace("```", "").strip()
-            variants = json.loads(raw)
+            variants = self._generate_json(prompt, "expand_query")
             if isinstance(variants, list):
                 return [str(v) for v in variants[:3]] # 确保只取前3个
             return []
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .logger import get_logger
+from .utils import ensure_dir, now_ts
+
+logger = get_logger()
+
+
+class JsonCache:
+    """
+    简单的持久化 KV 缓存：整个缓存保存为一个 JSON 文件，进程内常驻字典。
+
+    - get/put 线程安全，可在并发核查中直接使用
+    - save() 先写临时文件再替换，避免中断时留下半截文件
+    - 条目数超过 max_entries 时，save() 按最近使用时间淘汰最旧的条目，文件大小有上限
+    """
+
+    def __init__(self, path: Path, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: Dict[str, Any] = {}
+        self._dirty = False
+        if path.exists():
+            try:
+                self._data = json.loads(path.read_text(encoding="utf-8"))
+            except Exception as e:
+                logger.warning(f"缓存文件损坏，已忽略: {path} ({e})")
+                self._data = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if not isinstance(entry, dict):
+                return None
+            # 命中即刷新使用时间，淘汰时保留仍在使用的条目
+            entry["used_at"] = now_ts()
+            self._dirty = True
+        return entry.get("value")
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            ts = now_ts()
+            self._data[key] = {"value": value, "created_at": ts, "used_at": ts}
+            self._dirty = True
+
+    def _evict(self) -> None:
+        excess = len(self._data) - self.max_entries
+        if excess <= 0:
+            return
+        def _last_used(item):
+            entry = item[1]
+            if not isinstance(entry, dict):
+                return ""
+            return entry.get("used_at") or entry.get("created_at") or ""
+        for key, _ in sorted(self._data.items(), key=_last_used)[:excess]:
+            del self._data[key]
+        logger.info(f"缓存 {self.path.name} 超过 {self.max_entries} 条，已淘汰 {excess} 条最久未使用的条目")
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self._evict()
+            ensure_dir(self.path.parent)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(self._data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def _unit_rows(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def cosine_to_query(query_vector: Sequence[float], vectors: List[Sequence[float]]) -> np.ndarray:
+    """query 与一组向量的余弦相似度（向量化计算）。"""
+    if not vectors:
+        return np.zeros(0, dtype=np.float32)
+    mat = _unit_rows(np.asarray(np.stack(vectors), dtype=np.float32))
+    q = np.asarray(query_vector, dtype=np.float32)
+    q_norm = float(np.linalg.norm(q)) or 1.0
+    return mat @ (q / q_norm)
+
+
+def mmr_select(
+    query_vector: Sequence[float],
+    candidates: List[Dict[str, Any]],
+    top_n: int,
+    lambda_mult: float = 0.7,
+    collapse_parent: bool = False,
+    max_per_parent: int = 1,
+) -> List[Dict[str, Any]]:
+    """
+    Maximal Marginal Relevance：在候选池中贪心选择 top_n 条，兼顾相关度与多样性。
+
+    - 直接复用 LanceDB 返回的 `vector` 列，不产生额外的检索/嵌入调用
+    - 相似度矩阵一次性向量化计算（余弦）
+    - collapse_parent=True 时，同一 parent_id 最多保留 max_per_parent 条 child
+    """
+    if not candidates or top_n <= 0:
+        return []
+    vectors = [c.get("vector") for c in candidates]
+    if any(v is None or len(v) == 0 for v in vectors):
+        # 缺少向量时无法做 MMR，保持原顺序截断
+        return candidates[:top_n]
+
+    mat = _unit_rows(np.asarray(np.stack(vectors), dtype=np.float32))
+    q = np.asarray(query_vector, dtype=np.float32)
+    relevance = mat @ (q / (float(np.linalg.norm(q)) or 1.0))
+    pairwise = mat @ mat.T
+
+    n = len(candidates)
+    selected: List[int] = []
+    available = np.ones(n, dtype=bool)
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    parent_counts: Dict[Optional[str], int] = {}
+
+    while len(selected) < min(top_n, n) and available.any():
+        if selected:
+            scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_sim
+        else:
+            scores = relevance.copy()
+        scores = np.where(available, scores, -np.inf)
+        best = int(np.argmax(scores))
+        if not np.isfinite(scores[best]):
+            break
+        available[best] = False
+        if collapse_parent:
+            pid = candidates[best].get("parent_id")
+            if parent_counts.get(pid, 0) >= max_per_parent:
+                continue
+            parent_counts[pid] = parent_counts.get(pid, 0) + 1
+        selected.append(best)
+        max_sim = np.maximum(max_sim, pairwise[:, best])
+
+    out = []
+    for idx in selected:
+        rec = candidates[idx]
+        rec["_relevance"] = float(relevance[idx])
+        out.append(rec)
+    return out
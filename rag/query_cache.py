@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import config_hash
+from .logger import get_logger
+from .utils import ensure_dir, now_ts, read_json, sha256_str
+
+logger = get_logger()
+
+# 缓存结果中不保存的大字段（向量可随时从索引取回）
+_DROP_FIELDS = {"vector"}
+
+
+def normalize_query(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def retrieval_config_hash(cfg: dict) -> str:
+    """只对影响检索结果的配置段求哈希（embedding 模型/维度 + rerank/MMR）。"""
+    emb = cfg.get("embedding", {})
+    subset = {
+        "embedding": {"model": emb.get("model"), "output_dim": emb.get("output_dim")},
+        "rerank": cfg.get("rerank", {}),
+    }
+    return config_hash(subset)
+
+
+def _jsonable(value: Any) -> Any:
+    # pandas/numpy 标量转为原生类型，NaN 转 None
+    if hasattr(value, "item") and not isinstance(value, (list, dict, str)):
+        try:
+            value = value.item()
+        except Exception:
+            pass
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _score_of(rec: Dict[str, Any]) -> Optional[float]:
+    for key in ("_relevance", "_distance", "_score", "score"):
+        if rec.get(key) is not None:
+            try:
+                return float(rec[key])
+            except Exception:
+                return None
+    return None
+
+
+class QueryCache:
+    """
+    以 build 为作用域的检索结果缓存：meta/query_cache/{build_id}/{key}.json
+
+    key = sha256(build_id, 规范化 query, filter, 检索配置哈希)。
+    新 build 出现后，旧 build 的缓存目录在首次打开时被整体清除；
+    不产生新 build 的写表操作（embed-one）需调用 clear() 使缓存失效。
+    """
+
+    def __init__(self, root: Path, build_id: str, retrieval_hash: str):
+        self.root = root
+        self.build_id = build_id
+        self.retrieval_hash = retrieval_hash
+        self.dir = root / build_id
+        self._evict_stale()
+        ensure_dir(self.dir)
+
+    @classmethod
+    def for_build(cls, meta_path: Path, build_id: str, cfg: dict) -> "QueryCache":
+        return cls(meta_path / "query_cache", build_id, retrieval_config_hash(cfg))
+
+    @staticmethod
+    def clear(meta_path: Path) -> None:
+        """清空全部检索缓存（表内容变化但 build_id 不变时调用）。"""
+        root = meta_path / "query_cache"
+        if root.exists():
+            shutil.rmtree(root, ignore_errors=True)
+            logger.info("query cache: 索引已更新，已清空检索缓存")
+
+    def _evict_stale(self) -> None:
+        if not self.root.exists():
+            return
+        for d in self.root.iterdir():
+            if d.is_dir() and d.name != self.build_id:
+                shutil.rmtree(d, ignore_errors=True)
+                logger.info(f"query cache: 已清除过期 build 缓存 {d.name}")
+
+    def key(self, query: str, extra_filter: Optional[str] = None) -> str:
+        payload = json.dumps(
+            [self.build_id, normalize_query(query), extra_filter or "", self.retrieval_hash],
+            ensure_ascii=False,
+        )
+        return sha256_str(payload)
+
+    def get(self, query: str, extra_filter: Optional[str] = None) -> Optional[Tuple[List[dict], List[str]]]:
+        path = self.dir / f"{self.key(query, extra_filter)}.json"
+        if not path.exists():
+            return None
+        try:
+            data = read_json(path)
+        except Exception:
+            return None
+        return data.get("results", []), data.get("variants", [])
+
+    def put(self, query: str, extra_filter: Optional[str], results: List[dict], variants: List[str]) -> None:
+        slim = [{k: _jsonable(v) for k, v in r.items() if k not in _DROP_FIELDS} for r in results]
+        data = {
+            "build_id": self.build_id,
+            "query": query,
+            "filter": extra_filter,
+            "variants": variants,
+            "candidate_ids": [r.get("chunk_id") for r in slim],
+            "scores": [_score_of(r) for r in slim],
+            "results": slim,
+            "created_at": now_ts(),
+        }
+        path = self.dir / f"{self.key(query, extra_filter)}.json"
+        # batch 模式下多个线程/进程可能同时写同一 key：各自写独立临时文件后原子替换，读方不会看到半截文件
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, path)
+        except Exception as e:
+            tmp.unlink(missing_ok=True)
+            logger.warning(f"query cache 写入失败（忽略）: {e}")
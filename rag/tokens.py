@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import re
+
+import numpy as np
+
+# CJK 统一表意文字、假名、韩文音节：每个字符约计 1 token（字符类片段，供 dedup 分词复用）
+CJK_CHAR_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_CJK_RE = re.compile(f"[{CJK_CHAR_RANGES}]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    本地快速 token 估算（无需调用 API）：
+    - CJK 字符按 1 token/字
+    - 其余字符按约 4 字符/token
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+# 与 _CJK_RE 相同的码位区间
+_CJK_RANGES = ((0x3040, 0x30FF), (0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xAC00, 0xD7AF), (0xF900, 0xFAFF))
+
+
+def token_prefix(text: str) -> np.ndarray:
+    """
+    逐字符 token 前缀和（与 estimate_tokens 同一估算口径，CJK 1 token/字，其余 0.25 token/字）：
+    prefix[i] 为 text[:i] 的估算 token 数，长度 len(text)+1，用于按 token 预算二分定位切分点。
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    cjk = np.zeros(len(codes), dtype=bool)
+    for lo, hi in _CJK_RANGES:
+        cjk |= (codes >= lo) & (codes <= hi)
+    prefix = np.empty(len(codes) + 1, dtype=np.float64)
+    prefix[0] = 0.0
+    np.cumsum(np.where(cjk, 1.0, 0.25), out=prefix[1:])
+    return prefix
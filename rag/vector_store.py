@@ -1,22 +1,51 @@
 ﻿import os
 import random
+import threading
 import time
 from collections import deque
 from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 
 import lancedb
-import pandas as pd
-import vertexai
-from vertexai.language_models import TextEmbeddingInput, TextEmbeddingModel
+import numpy as np
+from vertexai.language_models import TextEmbeddingInput
 
+from . import chunk_store, vertex_client
+from .chunk_store import ChunkRecord
 from .logger import get_logger
-from .utils import get_google_project_id, write_json
+from .tokens import estimate_tokens
+from .utils import write_json
 
 logger = get_logger()
 
 
+class _VectorBlock:
+    """一个 checkpoint 批次的向量：首个向量到达时按维度预分配 (n, dim) float32 连续块，按批内下标写入"""
+
+    __slots__ = ("data", "filled")
+
+    def __init__(self, n: int):
+        self.data: Optional[np.ndarray] = None
+        self.filled = np.zeros(n, dtype=bool)
+
+    def put(self, idx: int, values) -> None:
+        if self.data is None:
+            self.data = np.empty((len(self.filled), len(values)), dtype=np.float32)
+        self.data[idx] = values
+        self.filled[idx] = True
+
+    def __contains__(self, idx: int) -> bool:
+        return bool(self.filled[idx])
+
+    def take(self) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """返回 (已写入的下标, 对应向量块)"""
+        idx = np.flatnonzero(self.filled)
+        if self.data is None or len(idx) == len(self.filled):
+            return idx, self.data
+        return idx, self.data[idx]
+
+
 class VectorStore:
     def __init__(
         self,
@@ -24,51 +53,65 @@ class VectorStore:
         table_name: str = "chunks",
         model_name: str = "text-embedding-004",
         output_dimensionality: Optional[int] = None,
+        max_request_tokens: int = 20000,
     ):
         self.db_path = db_path
         self.table_name = table_name
         self.db = lancedb.connect(db_path)
         self.embedding_model = None
+        self._table = None
+        self._model_lock = threading.Lock()
         self.model_name = model_name
         self.output_dimensionality = output_dimensionality
         # gemini-embedding-001 only supports single input
         self.max_batch_size = 1 if model_name == "gemini-embedding-001" else 100
+        # 批量模型单次请求的 token 上限：按本地估算把 chunk 装箱到接近该预算
+        self.max_request_tokens = max_request_tokens
         self.status_path = Path(os.environ.get("RAG_STATUS_FILE", "meta/embed_status.json"))
 
     def _get_embedding_model(self, model_name: Optional[str] = None):
         model_name = model_name or self.model_name
         if self.embedding_model is None:
-            # If env proxies point to localhost:9, bypass to avoid Vertex connection failures
-            for k in ["HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy", "all_proxy"]:
-                v = os.environ.get(k, "")
-                if "127.0.0.1:9" in v:
-                    os.environ[k] = ""
-            if os.environ.get("NO_PROXY") is None:
-                os.environ["NO_PROXY"] = "*"
-            project_id = get_google_project_id()
-            location = os.environ.get("GCP_LOCATION", "us-central1")
-            if project_id:
-                vertexai.init(project=project_id, location=location)
-            self.embedding_model = TextEmbeddingModel.from_pretrained(model_name)
+            with self._model_lock:
+                if self.embedding_model is None:
+                    self.embedding_model = vertex_client.embedding_model(model_name)
         return self.embedding_model
 
-    def get_embeddings(self, texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> List[List[float]]:
+    def _embed_call(self, model, inputs):
+        return vertex_client.get_embeddings(model, inputs, output_dimensionality=self.output_dimensionality)
+
+    def _pack_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """按条数上限与估算 token 预算把 texts 顺序装箱，返回 [(起, 止)) 区间列表"""
+        batches = []
+        i = 0
+        while i < len(texts):
+            j = i
+            used = 0
+            while j < len(texts) and j - i < self.max_batch_size:
+                cost = estimate_tokens(texts[j])
+                if j > i and used + cost > self.max_request_tokens:
+                    break
+                used += cost
+                j += 1
+            batches.append((i, j))
+            i = j
+        return batches
+
+    def _iter_embeddings(self, texts: List[str], task_type: str) -> Iterator[Tuple[int, List[Any]]]:
+        """逐个请求批产出 (起始下标, 该批 embedding 结果)"""
         model = self._get_embedding_model()
-        all_embeddings = []
-        batch_size = self.max_batch_size
-
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i : i + batch_size]
-            inputs = [TextEmbeddingInput(text, task_type) for text in batch_texts]
+        for i, j in self._pack_batches(texts):
+            inputs = [TextEmbeddingInput(text, task_type) for text in texts[i:j]]
             try:
-                if self.output_dimensionality:
-                    embeddings = model.get_embeddings(inputs, output_dimensionality=self.output_dimensionality)
-                else:
-                    embeddings = model.get_embeddings(inputs)
-                all_embeddings.extend([e.values for e in embeddings])
+                yield i, self._embed_call(model, inputs)
             except Exception as e:
                 logger.error(f"Embedding batch {i} failed: {e}")
                 raise e
+
+    def get_embeddings(self, texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> List[List[float]]:
+        all_embeddings = []
+        for _, embeddings in self._iter_embeddings(texts, task_type):
+            all_embeddings.extend([e.values for e in embeddings])
         return all_embeddings
 
     def _embed_one_with_retry(
@@ -85,10 +128,7 @@ class VectorStore:
         for attempt in range(max_retries):
             try:
                 inputs = [TextEmbeddingInput(text, task_type)]
-                if self.output_dimensionality:
-                    embeddings = model.get_embeddings(inputs, output_dimensionality=self.output_dimensionality)
-                else:
-                    embeddings = model.get_embeddings(inputs)
+                embeddings = self._embed_call(model, inputs)
                 return embeddings[0].values, retries, saw_throttle, None
             except Exception as e:
                 msg = str(e)
@@ -102,19 +142,22 @@ class VectorStore:
                 time.sleep(wait)
         return None, retries, saw_throttle, last_err
 
-    def add_chunks(self, chunks: List[Dict[str, Any]]):
+    def add_chunks(self, chunks: List[ChunkRecord]):
+        """
+        增量写入：已在表中的 hash 跳过，其余计算向量后按 checkpoint 批追加。
+        每批向量写入预分配的 float32 连续块，与 chunk 字段按列组装成 Arrow 表后直接写入 LanceDB。
+        """
         if not chunks:
             return
 
-        existing_map = {}
         existing_hashes = set()
         if self.table_name in self.db.table_names():
             try:
                 tbl = self.db.open_table(self.table_name)
-                df_exist = tbl.to_pandas()
-                if "hash" in df_exist.columns and "vector" in df_exist.columns:
-                    existing_map = dict(zip(df_exist["hash"], df_exist["vector"]))
-                    existing_hashes = set(df_exist["hash"].tolist())
+                if "hash" in tbl.schema.names:
+                    # 只读 hash 一列，不加载向量
+                    hashes = tbl.search().select(["hash"]).limit(None).to_arrow().column("hash")
+                    existing_hashes = set(hashes.to_pylist())
             except Exception as e:
                 logger.warning(f"读取现有向量表失败，将执行全量更新: {e}")
 
@@ -122,6 +165,8 @@ class VectorStore:
         concurrency = 32
         min_concurrency = 8
         max_concurrency = 128
+        # 自适应并发可能高于配置值，让共享调用池容纳得下
+        vertex_client.reserve(max_concurrency)
         max_retries = 5
         heartbeat_interval = 10
         stall_timeout = int(os.environ.get("RAG_STALL_TIMEOUT", "600"))
@@ -152,28 +197,20 @@ class VectorStore:
                 rate=None,
             )
 
-            batch_rows = []
             to_embed: List[Tuple[int, str]] = []
             reused_count = 0
 
             for i, c in enumerate(batch):
-                h = c.get("hash")
-                if h and h in existing_map:
-                    if h in existing_hashes:
-                        reused_count += 1
-                        continue
-                    row = dict(c)
-                    row["vector"] = existing_map[h]
-                    batch_rows.append(row)
+                if c.hash and c.hash in existing_hashes:
                     reused_count += 1
                 else:
-                    to_embed.append((i, c["text"]))
+                    to_embed.append((i, c.text))
 
             retry_count = 0
             fail_count = 0
             saw_throttle = False
 
-            index_to_vec: Dict[int, List[float]] = {}
+            vectors = _VectorBlock(len(batch))
             failed_items: List[Tuple[int, str, Optional[str]]] = []
             last_error: Optional[str] = None
 
@@ -210,10 +247,10 @@ class VectorStore:
                                 saw_throttle = saw_throttle or throttled
                                 if vec is None:
                                     fail_count += 1
-                                    failed_items.append((idx, batch[idx]["text"], err))
+                                    failed_items.append((idx, batch[idx].text, err))
                                     last_error = err
                                 else:
-                                    index_to_vec[idx] = vec
+                                    vectors.put(idx, vec)
                                 batch_done += 1
                                 last_progress = time.time()
                                 total_done = processed + batch_done
@@ -273,13 +310,16 @@ class VectorStore:
                                     degrade_start = None
                 else:
                     try:
-                        batch_vectors = self.get_embeddings([t for _, t in to_embed])
-                        for (i, _), vec in zip(to_embed, batch_vectors):
-                            index_to_vec[i] = vec
+                        # 逐请求批直接写入向量块，不累积整批的 list[float]
+                        texts = [t for _, t in to_embed]
+                        for start, embeddings in self._iter_embeddings(texts, "RETRIEVAL_DOCUMENT"):
+                            for k, e in enumerate(embeddings):
+                                vectors.put(to_embed[start + k][0], e.values)
                     except Exception as e:
-                        fail_count = len(to_embed)
                         last_error = str(e)
-                        failed_items = [(i, t, str(e)) for i, t in to_embed]
+                        # 已成功的请求批保留，只把未拿到向量的条目计为失败
+                        failed_items = [(i, t, str(e)) for i, t in to_embed if i not in vectors]
+                        fail_count = len(failed_items)
 
                 # 批内失败项：再重试一次（单条）
                 if failed_items:
@@ -297,32 +337,24 @@ class VectorStore:
                             still_failed.append((idx, text, err))
                             last_error = err
                         else:
-                            index_to_vec[idx] = vec
+                            vectors.put(idx, vec)
                     fail_count = len(still_failed)
                     failed_items = still_failed
-
-                for i, _ in to_embed:
-                    vec = index_to_vec.get(i)
-                    if vec is None:
-                        continue
-                    row = dict(batch[i])
-                    row["vector"] = vec
-                    batch_rows.append(row)
             else:
                 no_api = f"Batch {batch_start//checkpoint_size+1}: 无需调用 API。"
                 logger.info(no_api)
                 print(no_api, flush=True)
 
-            if batch_rows:
-                df_batch = pd.DataFrame(batch_rows)
+            done_idx, block = vectors.take()
+            if len(done_idx):
+                rows = [batch[i] for i in done_idx]
+                data = chunk_store.records_table(rows, vectors=block)
                 if table is None:
-                    table = self.db.create_table(self.table_name, data=df_batch, mode="overwrite")
+                    table = self.db.create_table(self.table_name, data=data, mode="overwrite")
                 else:
-                    table.add(df_batch)
-                for row in batch_rows:
-                    h = row.get("hash")
-                    if h:
-                        existing_hashes.add(h)
+                    table.add(data)
+                existing_hashes.update(c.hash for c in rows if c.hash)
+                del data, block
 
             # 记录失败清单
             if failed_items:
@@ -459,15 +491,82 @@ class VectorStore:
             # Avoid crashing on status write issues
             pass
 
-    def search(self, query_text: str, limit: int = 10, filters: Optional[str] = None) -> List[Dict]:
-        query_vector = self.get_embeddings([query_text], task_type="RETRIEVAL_QUERY")[0]
-        table = self.db.open_table(self.table_name)
-        query = table.search(query_vector).limit(limit)
-        if filters:
-            query = query.where(filters)
-        results = query.to_pandas()
-        return results.to_dict('records')
+    def embed_query(self, query_text: str) -> List[float]:
+        return self.get_embeddings([query_text], task_type="RETRIEVAL_QUERY")[0]
+
+    def embed_queries(self, texts: List[str], concurrency: int = 4) -> List[List[float]]:
+        """
+        批量生成查询向量：支持多输入的模型走批量接口，单输入模型（gemini-embedding-001）并发调用。
+        """
+        if not texts:
+            return []
+        if self.max_batch_size > 1:
+            return self.get_embeddings(texts, task_type="RETRIEVAL_QUERY")
+        workers = max(1, min(concurrency, len(texts)))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(self.embed_query, texts))
+
+    def _open_table(self):
+        # 同一进程内复用表句柄，避免每次检索都 open_table
+        if self._table is None:
+            self._table = self.db.open_table(self.table_name)
+        return self._table
+
+    def search(
+        self,
+        query_text: str,
+        limit: int = 10,
+        filters: Optional[str] = None,
+        query_vector: Optional[List[float]] = None,
+    ) -> List[Dict]:
+        vectors = [query_vector] if query_vector is not None else None
+        return self.search_many([query_text], limit=limit, filters=filters, query_vectors=vectors)[0]
+
+    def search_many(
+        self,
+        queries: List[str],
+        limit: int = 10,
+        filters: Optional[str] = None,
+        query_vectors: Optional[List[List[float]]] = None,
+        concurrency: int = 4,
+    ) -> List[List[Dict]]:
+        """
+        批量检索：查询向量批量生成（或直接传入），共享同一表句柄并发执行向量检索。
+        返回与 queries 一一对应的结果列表；结果直接由 Arrow 转换，不逐条构建 DataFrame。
+        """
+        if not queries:
+            return []
+        if query_vectors is None:
+            query_vectors = self.embed_queries(queries, concurrency=concurrency)
+        table = self._open_table()
+
+        def _one(vec) -> List[Dict]:
+            query = table.search(vec).limit(limit)
+            if filters:
+                query = query.where(filters)
+            return _arrow_to_records(query.to_arrow())
+
+        if len(queries) == 1:
+            return [_one(query_vectors[0])]
+        workers = max(1, min(concurrency, len(queries)))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(_one, query_vectors))
 
     def rerank(self, query: str, results: List[Dict], model: str = "semantic-ranker-default-004") -> List[Dict]:
         logger.info(f"正在对 {len(results)} 条结果进行重排 (Model: {model})...")
         return results
+
+
+def _arrow_to_records(tbl) -> List[Dict]:
+    """Arrow 结果转 dict 列表；vector 列整体转为 float32 矩阵后按行切片，避免逐元素装箱。"""
+    if tbl.num_rows == 0:
+        return []
+    if "vector" not in tbl.column_names:
+        return tbl.to_pylist()
+    vec_col = tbl.column("vector").combine_chunks()
+    matrix = vec_col.flatten().to_numpy(zero_copy_only=False).astype("float32", copy=False)
+    matrix = matrix.reshape(tbl.num_rows, -1)
+    records = tbl.drop(["vector"]).to_pylist()
+    for rec, vec in zip(records, matrix):
+        rec["vector"] = vec
+    return records
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+from . import cassette
+from .logger import get_logger
+from .utils import get_google_project_id
+
+logger = get_logger()
+
+# 进程级共享的 Vertex 客户端层：
+# - vertexai.init 与代理环境修正每个进程只执行一次
+# - 模型句柄按名称缓存，VectorStore 与 RagJudge 共用同一底层连接
+# - 所有远程调用经同一个调用池执行，池大小取 embedding.concurrency；调用先占用并发名额再提交，
+#   超时从调用真正开始执行时计算，排队等待名额的时间不计入
+# - embedding.timeout_seconds / judge.timeout_seconds 分别作为 embedding 与生成调用的请求超时传给 SDK；
+#   本地等待在其基础上留出余量，仅作兜底
+# - 设置 RAG_CASSETTE 时模型句柄换成录制/回放代理（见 cassette.py）
+
+_lock = threading.Lock()
+_initialized = False
+_models: Dict[tuple, Any] = {}
+_settings: Dict[str, Any] = {"concurrency": 4, "timeout_seconds": 30.0, "generation_timeout_seconds": 120.0}
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_size = 0
+_slots = threading.Condition()
+_running = 0
+# 本地等待比 SDK 请求超时多留的余量（秒）
+_LOCAL_GRACE_SECONDS = 5.0
+# 已确认私有接口不可用、改走公开接口的调用类型（"generation" / "embedding"）
+_private_api_disabled: set = set()
+
+
+class CallTimeout(TimeoutError):
+    """
+    本地兜底等待超时：SDK 未在请求超时内返回，调用线程可能仍被占用。
+    不应在同一调用池内立即重试，否则会与仍在运行的调用叠加。
+    """
+
+
+def configure(cfg: Dict[str, Any]) -> None:
+    """从配置读取并发上限与请求超时（embedding.timeout_seconds / judge.timeout_seconds）；在创建 VectorStore/RagJudge 之前调用。"""
+    emb = cfg.get("embedding", {}) or {}
+    with _lock:
+        _settings["concurrency"] = max(1, int(emb.get("concurrency", 4)))
+        timeout = emb.get("timeout_seconds")
+        _settings["timeout_seconds"] = float(timeout) if timeout else None
+        # 生成调用（审计、批量核查）的输出远长于 embedding，单独使用 judge.timeout_seconds
+        gen_timeout = (cfg.get("judge", {}) or {}).get("timeout_seconds")
+        _settings["generation_timeout_seconds"] = float(gen_timeout) if gen_timeout else _settings["timeout_seconds"]
+
+
+def timeout_seconds() -> Optional[float]:
+    return _settings["timeout_seconds"]
+
+
+def _fix_proxy_env() -> None:
+    # If env proxies point to localhost:9, bypass to avoid Vertex connection failures
+    for k in ["HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy", "all_proxy"]:
+        v = os.environ.get(k, "")
+        if "127.0.0.1:9" in v:
+            os.environ[k] = ""
+    if os.environ.get("NO_PROXY") is None:
+        os.environ["NO_PROXY"] = "*"
+
+
+def init_vertex(project_id: Optional[str] = None, location: Optional[str] = None) -> None:
+    """进程内只初始化一次 Vertex AI。"""
+    global _initialized
+    with _lock:
+        if _initialized:
+            return
+        tape = cassette.active()
+        if tape is not None and tape.mode == "replay":
+            return
+        import vertexai
+
+        _fix_proxy_env()
+        project_id = project_id or get_google_project_id()
+        location = location or os.environ.get("GCP_LOCATION", "us-central1")
+        if project_id:
+            vertexai.init(project=project_id, location=location)
+        _initialized = True
+
+
+def embedding_model(model_name: str):
+    key = ("embedding", model_name)
+    if key not in _models:
+        tape = cassette.active()
+        if tape is not None and tape.mode == "replay":
+            # 回放模式完全离线，不初始化 Vertex
+            model = tape.embedding_model(model_name)
+        else:
+            init_vertex()
+            from vertexai.language_models import TextEmbeddingModel
+
+            model = TextEmbeddingModel.from_pretrained(model_name)
+            if tape is not None:
+                model = tape.embedding_model(model_name, model)
+        with _lock:
+            _models.setdefault(key, model)
+    return _models[key]
+
+
+def generative_model(model_name: str):
+    key = ("generative", model_name)
+    if key not in _models:
+        tape = cassette.active()
+        if tape is not None and tape.mode == "replay":
+            model = tape.generative_model(model_name)
+        else:
+            init_vertex()
+            from vertexai.generative_models import GenerativeModel
+
+            model = GenerativeModel(model_name)
+            if tape is not None:
+                model = tape.generative_model(model_name, model)
+        with _lock:
+            _models.setdefault(key, model)
+    return _models[key]
+
+
+def reserve(workers: int) -> None:
+    """确保调用池至少有 workers 个线程（如 embed 的自适应并发高于配置值时）。"""
+    _get_pool(workers)
+
+
+def _get_pool(min_workers: int = 0) -> ThreadPoolExecutor:
+    global _pool, _pool_size
+    with _lock:
+        size = max(_settings["concurrency"], min_workers)
+        grown = _pool is None or size > _pool_size
+        if grown:
+            old = _pool
+            _pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix="vertex")
+            _pool_size = size
+            if old is not None:
+                old.shutdown(wait=False)
+        pool = _pool
+    if grown:
+        # 池扩容后唤醒等待名额的调用
+        with _slots:
+            _slots.notify_all()
+    return pool
+
+
+def _acquire_slot() -> None:
+    global _running
+    with _slots:
+        while _running >= _pool_size:
+            _slots.wait()
+        _running += 1
+
+
+def _release_slot() -> None:
+    global _running
+    with _slots:
+        _running -= 1
+        _slots.notify()
+
+
+def call(fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+    """
+    在共享调用池中执行一次远程调用并等待结果。
+    调用前先等待空闲名额（不计时），名额在调用实际结束时释放；
+    超过 timeout + 余量仍未返回时抛出 CallTimeout。timeout 缺省取 embedding.timeout_seconds。
+    """
+    timeout = timeout if timeout is not None else _settings["timeout_seconds"]
+    pool = _get_pool()
+    _acquire_slot()
+
+    def _run() -> Any:
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _release_slot()
+
+    try:
+        future = pool.submit(_run)
+    except BaseException:
+        _release_slot()
+        raise
+    try:
+        return future.result(timeout=timeout + _LOCAL_GRACE_SECONDS if timeout else None)
+    except FutureTimeout:
+        raise CallTimeout(f"Vertex 调用超时 (>{timeout:g}s)")
+
+
+def _private_api_unavailable(model, kind: str, reason: str) -> None:
+    """
+    私有接口缺失或签名变化（SDK 升级）时改走公开接口：SDK 侧不再设请求超时，只剩本地兜底等待。
+    每类调用只告警一次，之后直接走公开接口；录制/回放代理本就只实现公开接口，不告警。
+    """
+    if cassette.is_proxy(model):
+        return
+    with _lock:
+        if kind in _private_api_disabled:
+            return
+        _private_api_disabled.add(kind)
+    logger.warning(
+        f"Vertex SDK 私有接口不可用（{reason}），{kind} 调用改走公开接口，SDK 请求超时失效，仅保留本地兜底超时；"
+        f"请核对 google-cloud-aiplatform 版本"
+    )
+
+
+def _generate_content(model, contents: Any, generation_config: Any, timeout: Optional[float]):
+    # 真实 SDK 的 GenerativeModel.generate_content 不接受 timeout，直接调用底层预测客户端以传入请求超时；
+    # 没有这些私有属性或其签名已变化时回退到公开接口
+    if timeout and "generation" not in _private_api_disabled:
+        client = getattr(model, "_prediction_client", None)
+        if client is not None and hasattr(model, "_prepare_request") and hasattr(model, "_parse_response"):
+            try:
+                request = model._prepare_request(contents=contents, generation_config=generation_config)
+                return model._parse_response(client.generate_content(request=request, timeout=timeout))
+            except (TypeError, AttributeError) as e:
+                _private_api_unavailable(model, "generation", f"{type(e).__name__}: {e}")
+        else:
+            _private_api_unavailable(model, "generation", "缺少 _prediction_client/_prepare_request/_parse_response")
+    return model.generate_content(contents, generation_config=generation_config)
+
+
+def _get_embeddings(model, inputs: List[Any], output_dimensionality: Optional[int], timeout: Optional[float]):
+    # 同上：TextEmbeddingModel.get_embeddings 不接受 timeout，改由 Endpoint.predict 传入
+    if timeout and "embedding" not in _private_api_disabled:
+        endpoint = getattr(model, "_endpoint", None)
+        if endpoint is not None and hasattr(model, "_prepare_text_embedding_request"):
+            try:
+                from vertexai.language_models import TextEmbedding
+
+                request = model._prepare_text_embedding_request(texts=inputs, output_dimensionality=output_dimensionality)
+                response = endpoint.predict(instances=request.instances, parameters=request.parameters, timeout=timeout)
+                return [TextEmbedding._parse_text_embedding_response(response, i) for i in range(len(response.predictions))]
+            except (TypeError, AttributeError, ImportError) as e:
+                _private_api_unavailable(model, "embedding", f"{type(e).__name__}: {e}")
+        else:
+            _private_api_unavailable(model, "embedding", "缺少 _endpoint/_prepare_text_embedding_request")
+    if output_dimensionality:
+        return model.get_embeddings(inputs, output_dimensionality=output_dimensionality)
+    return model.get_embeddings(inputs)
+
+
+def generate_content(model, contents: Any, generation_config: Any = None, timeout: Optional[float] = None):
+    """经共享调用池执行一次生成调用，请求超时（缺省取 judge.timeout_seconds）同时传给 SDK。"""
+    timeout = timeout if timeout is not None else _settings["generation_timeout_seconds"]
+    return call(_generate_content, model, contents, generation_config, timeout, timeout=timeout)
+
+
+def get_embeddings(model, inputs: List[Any], output_dimensionality: Optional[int] = None, timeout: Optional[float] = None):
+    """经共享调用池执行一次 embedding 调用，请求超时同时传给 SDK。"""
+    timeout = timeout if timeout is not None else _settings["timeout_seconds"]
+    return call(_get_embeddings, model, inputs, output_dimensionality, timeout, timeout=timeout)
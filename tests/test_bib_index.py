@@ -0,0 +1,74 @@
+from rag.bib_index import BibIndex, build_bib_record, parse_citation_query
+
+
+def _record(doc_uid, head, **meta):
+    return build_bib_record(dict(meta, doc_uid=doc_uid), [head])
+
+
+def _byline_record(doc_uid, byline, year):
+    return _record(doc_uid, f"A study of urban heat\n{byline}", year=year)
+
+
+def test_parse_citation_query():
+    assert parse_citation_query("Smith and Jones 2019") == (["smith", "jones"], "2019")
+    assert parse_citation_query("Smith et al., 2020a") == (["smith"], "2020")
+    assert parse_citation_query("no year here") == ([], None)
+
+
+def test_byline_authors_and_publication_year():
+    head = (
+        "Heat and mortality in cities\n"
+        "Jane A. Smith¹, John Doe and Mary Lee\n"
+        "Journal of Urban Health\n"
+        "As shown by Brown (2015) and Green (2015), heat kills. © 2019 Elsevier"
+    )
+    rec = _record("d1", head, raw_relpath="report.pdf")
+    assert rec["authors"] == ["smith", "doe", "lee"]
+    assert rec["year"] == "2019"
+
+
+def test_venue_and_title_words_are_not_authors():
+    head = "Urban Heat Islands\nJournal of Urban Health\nBrown (2015) and Green (2015) found more deaths."
+    rec = _record("d1", head)
+    assert rec["authors"] == []
+    # 被引文献中出现最多的年份不能当作出版年份
+    assert rec["year"] is None
+    assert BibIndex([rec]).lookup("Health 2015") is None
+
+
+def test_lookup_requires_exact_author_and_year():
+    index = BibIndex([
+        _byline_record("d1", "Jane Smith and John Doe", 2019),
+        _byline_record("d2", "Mary Lee", 2019),
+        _byline_record("d3", "Jane Smyth", 2019),
+    ])
+    assert index.lookup("Smith and Doe 2019")["doc_uid"] == "d1"
+    assert index.lookup("Smith 2019")["match"] == "exact"
+    assert index.lookup("Smith 2018") is None
+    assert index.lookup("Smith and Lee 2019") is None
+
+
+def test_fuzzy_lookup_is_bounded_and_unique():
+    index = BibIndex([
+        _byline_record("d1", "Jane Smith and John Doe", 2019),
+        _byline_record("d2", "Karl Müller", 2020),
+        _byline_record("d3", "Ana Lopez", 2019),
+        _byline_record("d4", "Ana Lopes", 2019),
+    ])
+    hit = index.lookup("Smyth and Doe 2019")
+    assert (hit["doc_uid"], hit["match"]) == ("d1", "fuzzy")
+    # 变音符号不影响精确匹配
+    assert index.lookup("Muller 2020")["match"] == "exact"
+    assert index.lookup("Mueller 2020")["doc_uid"] == "d2"
+    # 年份仍须一致；距离 2 不算；短姓氏不做模糊；多篇同时命中视为未命中
+    assert index.lookup("Smyth 2020") is None
+    assert index.lookup("Smythe 2019") is None
+    assert index.lookup("Smiht and Doe 2019") is None
+    assert index.lookup("Dow 2019") is None
+    assert index.lookup("Lopey 2019") is None
+    assert index.lookup("Lopez 2019")["doc_uid"] == "d3"
+
+
+def test_lookup_is_a_miss_when_ambiguous():
+    index = BibIndex([_byline_record("d1", "Jane Smith", 2019), _byline_record("d2", "Paul Smith", 2019)])
+    assert index.lookup("Smith 2019") is None
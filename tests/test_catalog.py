@@ -0,0 +1,40 @@
+import json
+import sqlite3
+
+from rag.catalog import CATALOG_FILE, DocCatalog
+
+
+def test_legacy_meta_json_is_migrated(tmp_path):
+    (tmp_path / "doc1.json").write_text(json.dumps({"doc_uid": "doc1", "citable": False, "year": 2019}), encoding="utf-8")
+    (tmp_path / "project.json").write_text(json.dumps({"name": "p"}), encoding="utf-8")
+    with DocCatalog(tmp_path) as catalog:
+        assert catalog.get("doc1") == {"doc_uid": "doc1", "citable": False, "source_type": "evidence", "year": "2019"}
+        assert catalog.get("project") is None
+
+
+def test_chunked_doc_uids_follow_chunk_order(tmp_path):
+    with DocCatalog(tmp_path) as catalog:
+        catalog.set_chunk_stats([("zeta", 1, 2, None), ("alpha", 1, 0, None), ("beta", 1, 3, None)])
+        assert catalog.chunked_doc_uids() == ["zeta", "beta"]
+        catalog.clear_chunk_stats(["zeta"])
+        assert catalog.chunked_doc_uids() == ["beta"]
+
+
+def test_old_catalog_file_gains_new_columns(tmp_path):
+    conn = sqlite3.connect(tmp_path / CATALOG_FILE)
+    conn.execute(
+        """
+        CREATE TABLE docs (
+            doc_uid TEXT PRIMARY KEY, citable INTEGER NOT NULL DEFAULT 1, source_type TEXT NOT NULL DEFAULT 'evidence',
+            raw_relpath TEXT, split_from TEXT, page_range TEXT, authors TEXT, year TEXT, title TEXT, accessed_at TEXT,
+            extra TEXT, n_parents INTEGER, n_chunks INTEGER, bib TEXT, chunked_at TEXT, updated_at TEXT
+        )
+        """
+    )
+    conn.execute("INSERT INTO docs (doc_uid, n_chunks) VALUES ('old', 5)")
+    conn.commit()
+    conn.close()
+    with DocCatalog(tmp_path) as catalog:
+        assert catalog.chunked_doc_uids() == ["old"]
+        catalog.set_chunk_stats([("new", 1, 1, None), ("old", 1, 5, None)])
+        assert catalog.chunked_doc_uids() == ["new", "old"]
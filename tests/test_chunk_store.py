@@ -0,0 +1,48 @@
+import json
+
+from rag import chunk_store
+from rag.chunk_store import ChunkRecord
+
+
+def _records():
+    return [
+        ChunkRecord(
+            f"{uid}:p0000:c{i:02d}", f"{uid}:p0000", uid, f"text {uid} {i}",
+            i * 10, i * 10 + 8, 0, uid != "d2", "evidence", f"h{i}",
+        )
+        for uid in ("d1", "d2")
+        for i in range(3)
+    ]
+
+
+def test_write_and_load_roundtrip(tmp_path):
+    records = _records()
+    chunk_store.write_records(chunk_store.chunks_path(tmp_path), records, chunk_store.CHUNK_SCHEMA)
+
+    loaded = chunk_store.load_chunks(tmp_path)
+    assert [r.to_dict() for r in loaded] == [r.to_dict() for r in records]
+    only_d2 = chunk_store.load_chunks(tmp_path, doc_uid="d2")
+    assert [r.chunk_id for r in only_d2] == ["d2:p0000:c00", "d2:p0000:c01", "d2:p0000:c02"]
+    assert not any(r.citable for r in only_d2)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_concat_shards_and_export_jsonl(tmp_path):
+    records = _records()
+    shards = []
+    for uid in ("d1", "d2"):
+        shard = tmp_path / f"{uid}.chunks.parquet"
+        chunk_store.write_records(shard, [r for r in records if r.doc_uid == uid], chunk_store.CHUNK_SCHEMA)
+        shards.append(shard)
+    out = chunk_store.chunks_path(tmp_path)
+    chunk_store.concat_files(out, shards + [tmp_path / "missing.chunks.parquet"], chunk_store.CHUNK_SCHEMA)
+
+    dest = tmp_path / "chunks.jsonl"
+    assert chunk_store.export_jsonl(out, dest, batch_size=2) == len(records)
+    rows = [json.loads(line) for line in dest.read_text(encoding="utf-8").splitlines()]
+    assert rows == [r.to_dict() for r in records]
+
+
+def test_missing_files_read_as_empty(tmp_path):
+    assert chunk_store.load_chunks(tmp_path) == []
+    assert chunk_store.load_parents_map(tmp_path) == {}
@@ -0,0 +1,147 @@
+import json
+import shutil
+
+from rag import chunk_store
+from rag.catalog import DocCatalog
+from rag.chunker import SNIFF_BYTES, _iter_json_array, _sniff_json_format, run_chunking
+
+
+def _make_doc(parsed, uid, text):
+    d = parsed / uid
+    d.mkdir(parents=True)
+    (d / "full.md").write_text(text, encoding="utf-8")
+
+
+def _chunk(tmp_path, full=False):
+    run_chunking(tmp_path / "parsed", tmp_path / "chunks", tmp_path / "meta", workers=1, full=full)
+
+
+def test_full_rechunk_removes_shards_of_deleted_docs(tmp_path):
+    parsed = tmp_path / "parsed"
+    _make_doc(parsed, "docA", "Alpha paragraph about heat.\n\nMore alpha text here.")
+    _make_doc(parsed, "docB", "Beta paragraph about housing.\n\nMore beta text here.")
+    _chunk(tmp_path)
+    shards = tmp_path / "chunks" / "shards"
+    assert list(shards.glob("docB.*"))
+
+    shutil.rmtree(parsed / "docB")
+    _chunk(tmp_path, full=True)
+
+    assert not list(shards.glob("docB.*"))
+    table = chunk_store.read_table(chunk_store.chunks_path(tmp_path / "chunks"), columns=["doc_uid"])
+    assert set(table.column("doc_uid").to_pylist()) == {"docA"}
+    with DocCatalog(tmp_path / "meta") as catalog:
+        assert catalog.chunked_doc_uids() == ["docA"]
+
+
+def test_header_footer_stripping_only_touches_page_edges():
+    from rag.chunker import ParentChildChunker
+
+    topics = ["housing", "transport", "air quality", "green space"]
+    content = []
+    for page, topic in enumerate(topics):
+        content += [
+            {"type": "text", "text": "Journal of Urban Health", "page_idx": page},
+            {"type": "text", "text": f"This page opens with {topic}.", "page_idx": page},
+            {"type": "text", "text": f"Discussion of {topic} continues.", "page_idx": page},
+            {"type": "text", "text": "Source: World Bank data.", "page_idx": page},
+            {"type": "text", "text": f"Evidence on {topic} is mixed.", "page_idx": page},
+            {"type": "text", "text": f"Policy options for {topic} vary.", "page_idx": page},
+            {"type": "text", "text": f"The {topic} section ends.", "page_idx": page},
+            {"type": "text", "text": f"{page + 1}", "page_idx": page},
+        ]
+    chunker = ParentChildChunker(header_footer_threshold=0.6)
+    parents, _ = chunker._chunk_by_page_json("d1", content, {"doc_uid": "d1"})
+
+    assert len(parents) == len(topics)
+    for p in parents:
+        lines = p["parent_text"].splitlines()
+        assert "Journal of Urban Health" not in lines
+        assert "Source: World Bank data." in lines
+        assert len(lines) == 6
+        assert lines[-1] != str(p["page_index"] + 1)
+
+
+def _write_json(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return path
+
+
+def test_sniff_json_format_reads_top_level_keys(tmp_path):
+    items = [{"type": "text", "text": "a", "page_idx": 0}]
+    assert _sniff_json_format(_write_json(tmp_path / "a.json", items)) == "content_list"
+    assert _sniff_json_format(_write_json(tmp_path / "b.json", {"_backend": "x", "pdf_info": []})) == "pdf_info"
+    # pdf_info 只是嵌套对象的键，不是顶层键
+    nested = {"meta": {"pdf_info": 1}, "pages": []}
+    assert _sniff_json_format(_write_json(tmp_path / "c.json", nested)) is None
+    assert _sniff_json_format(_write_json(tmp_path / "d.json", [{"type": "text"}])) is None
+
+
+def test_sniff_json_format_falls_back_when_head_is_inconclusive(tmp_path):
+    big = "x" * (SNIFF_BYTES + 10)
+    items = [{"type": "text", "text": big, "page_idx": 0}]
+    assert _sniff_json_format(_write_json(tmp_path / "a.json", items)) == "content_list"
+    obj = {"_backend": big, "pdf_info": []}
+    assert _sniff_json_format(_write_json(tmp_path / "b.json", obj)) == "pdf_info"
+
+
+def test_iter_json_array_across_block_boundaries(tmp_path):
+    items = [{"type": "text", "text": f"item {i} " * (i % 7), "page_idx": i, "bbox": [0, 1]} for i in range(50)]
+    path = _write_json(tmp_path / "a.json", items)
+    expected = [{k: it[k] for k in ("type", "text", "page_idx")} for it in items]
+    assert list(_iter_json_array(path, block_size=64)) == expected
+
+
+def test_split_text_smart_offsets_point_into_parent_text():
+    from rag.chunker import ParentChildChunker
+    from rag.tokens import estimate_tokens
+
+    text = "\n\n".join(
+        f"  Paragraph {i} discusses 城市 heat exposure and housing quality in district {i}. "
+        f"It adds a second sentence with more detail about cooling access. "
+        for i in range(12)
+    )
+    chunker = ParentChildChunker(child_tokens=40, overlap_tokens=5)
+    childs = chunker._split_text_smart(text, "d1:p0000", "d1", {"doc_uid": "d1"}, 0)
+
+    assert len(childs) > 3
+    for c in childs:
+        assert text[c.char_start : c.char_end] == c.text
+        assert c.text == c.text.strip()
+        assert estimate_tokens(c.text) <= 40
+    assert [c.chunk_id for c in childs] == [f"d1:p0000:c{i:02d}" for i in range(len(childs))]
+    assert childs[-1].char_end == len(text.rstrip())
+
+
+def _full_window_cut_point(text, start, end):
+    # 整窗扫描的参考实现（_cut_point 只扫描窗口尾部，结果须与之一致）
+    window = end - start
+    last_para = text.rfind("\n\n", start, end)
+    last_line = text.rfind("\n", start, end)
+    last_punct = -1
+    for p in [". ", "。", "！", "!", "?", "？"]:
+        idx = text.rfind(p, start, end)
+        if idx > last_punct:
+            last_punct = idx + len(p)
+    if last_para != -1 and (end - last_para) < window * 0.4:
+        return last_para + 2
+    if last_punct != -1 and (end - last_punct) < window * 0.4:
+        return last_punct
+    if last_line != -1 and (end - last_line) < window * 0.2:
+        return last_line + 1
+    return end
+
+
+def test_cut_point_matches_full_window_scan():
+    import random
+
+    from rag.chunker import ParentChildChunker
+
+    chunker = ParentChildChunker()
+    rng = random.Random(3)
+    pieces = ["a", "bc", " ", ".", ". ", "\n", "\n\n", "。", "！", "!", "?", "？"]
+    for _ in range(20000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 60)))
+        start = rng.randrange(len(text))
+        end = rng.randint(start + 1, len(text))
+        assert chunker._cut_point(text, start, end) == _full_window_cut_point(text, start, end)
@@ -0,0 +1,121 @@
+from rag.cli import _audit_draft, _md_cell, _sources_used_from_chunks
+from rag.kv_cache import JsonCache
+
+
+def test_md_cell_escapes_pipes_and_newlines():
+    assert _md_cell("a | b\nc") == "a \\| b c"
+    assert _md_cell(None) == ""
+    assert _md_cell(3) == "3"
+
+
+class _FakeJudge:
+    model_name = "fake"
+
+    def __init__(self, claims):
+        self.claims = claims
+
+    def audit_claims(self, text):
+        return self.claims
+
+
+def test_audit_marks_unmatched_claim_unlocated_and_skips_cache(tmp_path):
+    text = "First paragraph here.\n\nSecond paragraph says prices doubled."
+    judge = _FakeJudge([
+        {"claim_text": "prices doubled", "claim_type": "data", "reason": "cite"},
+        {"claim_text": "Costs rose twofold", "claim_type": "data", "reason": "cite"},
+    ])
+    cache = JsonCache(tmp_path / "audit_cache.json")
+    cfg = {"audit": {"prefilter": False}}
+
+    claims, _ = _audit_draft(text, judge, cfg, cache)
+
+    located = [c for c in claims if not c.get("unlocated")]
+    unlocated = [c for c in claims if c.get("unlocated")]
+    assert [c["_offset"] for c in located] == [text.index("prices doubled")]
+    assert [c["claim_text"] for c in unlocated] == ["Costs rose twofold"]
+    assert len(cache) == 0
+
+
+def test_sources_used_falls_back_to_chunks_without_catalog_stats(tmp_path, monkeypatch):
+    from rag import chunk_store
+    from rag.chunk_store import ChunkRecord
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "chunks").mkdir()
+    records = [
+        ChunkRecord(f"{uid}:c{i}", f"{uid}:p0", uid, "text", 0, 4, 0, True, "evidence", "h")
+        for uid in ("docB", "docA")
+        for i in range(2)
+    ]
+    chunk_store.write_records(chunk_store.chunks_path(tmp_path / "chunks"), records, chunk_store.CHUNK_SCHEMA)
+    cfg = {"paths": {"meta": "meta", "chunks": "chunks"}}
+
+    assert _sources_used_from_chunks(cfg) == ["docB", "docA"]
+
+
+class _FakeVectorStore:
+    """每条断言命中与其首词同名的 chunk，命中结果只取决于断言自身。"""
+
+    def embed_queries(self, texts, concurrency=None):
+        return [[1.0, 0.0] for _ in texts]
+
+    def search_many(self, texts, limit, filters, query_vectors, concurrency=None):
+        return [
+            [{"chunk_id": f"d1:{t.split()[0]}", "hash": f"h-{t.split()[0]}", "text": t, "vector": [0.7, 0.7]}]
+            for t in texts
+        ]
+
+
+class _CountingJudge:
+    model_name = "fake"
+
+    def __init__(self):
+        self.sent = []
+
+    def verify_support_batch(self, sentences, evidence):
+        assert len(evidence) == len(sentences)
+        self.sent.extend(sentences)
+        return [{"support_score": 0.7, "status": "OK", "critique": "ok"} for _ in sentences]
+
+
+def test_verify_cache_keys_ignore_sibling_citations(tmp_path):
+    from rag.cli import _verify_doc_claims
+
+    cfg = {"verify_citations": {"fast_path": False, "batch_size": 8}}
+    cache = JsonCache(tmp_path / "verify_cache.json")
+    claims = [f"claim{i} says something about housing" for i in range(5)]
+
+    judge = _CountingJudge()
+    _verify_doc_claims("d1", claims, _FakeVectorStore(), judge, cfg, cache)
+    assert judge.sent == claims
+
+    edited = ["claim0 now says something else entirely"] + claims[1:]
+    judge = _CountingJudge()
+    verdicts = _verify_doc_claims("d1", edited, _FakeVectorStore(), judge, cfg, cache)
+    assert judge.sent == edited[:1]
+    assert [verdicts[c]["tier"] for c in edited] == ["llm"] + ["cache"] * 4
+
+
+def test_batch_query_marks_cache_hits_without_error(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    from rag import cli
+    from rag.query_cache import QueryCache
+
+    cache = QueryCache(tmp_path / "query_cache", "b1", "h")
+    cache.put("heat and health", None, [{"chunk_id": "c1"}], [])
+    cache.put("no evidence here", None, [], [])
+    batch = tmp_path / "questions.txt"
+    batch.write_text("heat and health\nno evidence here\n", encoding="utf-8")
+
+    monkeypatch.setattr(cli, "_load_parents_map", lambda cfg: {})
+    monkeypatch.setattr(cli, "_write_evidence_pack", lambda *a: (tmp_path / "pack_v001.md", "q1"))
+    monkeypatch.setattr(cli, "outputs_dir", lambda cfg: tmp_path)
+    monkeypatch.setattr(cli, "_write_version_log", lambda *a: None)
+    vs = SimpleNamespace(embed_queries=lambda texts, concurrency=None: [])
+    judge = SimpleNamespace(expand_query=lambda q: [])
+    cli._query_batch(SimpleNamespace(batch=str(batch)), {}, "b1", vs, judge, cache=cache)
+
+    rows = (tmp_path / "evidence_batch_v001.md").read_text(encoding="utf-8").splitlines()[-2:]
+    assert rows[0].endswith("| 1 | cached |")
+    assert rows[1].endswith("| 0 | 未找到相关证据; cached |")
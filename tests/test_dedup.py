@@ -0,0 +1,68 @@
+import random
+
+from rag.dedup import DEFAULT_MAX_DISTANCE, NearDupIndex, simhash64
+
+CHUNK = (
+    "Urban heat islands raise night-time temperatures in dense neighbourhoods, and the effect is strongest "
+    "where tree cover is low and buildings retain heat after sunset. Studies across European cities link "
+    "these warmer nights to higher hospital admissions among older residents, especially those living alone "
+    "in top-floor flats without cooling. Municipal responses range from planting programmes and reflective "
+    "roofing to cooling centres that open during heatwave alerts. Evaluations suggest that greening schemes "
+    "reduce surface temperatures by several degrees, although the benefits are unevenly distributed and "
+    "often favour wealthier districts. Researchers therefore recommend that adaptation budgets prioritise "
+    "areas with high social vulnerability, combining health records, housing data and satellite imagery to "
+    "target interventions where exposure and sensitivity overlap most clearly."
+)
+OTHER = (
+    "Rent stabilisation policies aim to limit annual increases for sitting tenants, but their long-run "
+    "effects on supply remain contested. Some analyses find that landlords convert regulated units into "
+    "condominiums, while others report reduced displacement and longer tenancies in covered buildings. "
+    "Cities that pair rent rules with public construction appear to avoid the largest supply losses."
+)
+
+
+def _distance(a, b):
+    return bin(simhash64(a) ^ simhash64(b)).count("1")
+
+
+def test_one_word_edit_is_caught_at_default_distance():
+    edited = CHUNK.replace("several degrees", "many degrees")
+    assert 3 < _distance(CHUNK, edited) <= DEFAULT_MAX_DISTANCE
+    index = NearDupIndex()
+    assert not index.seen(CHUNK)
+    assert index.seen(edited)
+
+
+def test_unrelated_text_is_not_a_duplicate():
+    assert _distance(CHUNK, OTHER) > DEFAULT_MAX_DISTANCE + 4
+    index = NearDupIndex()
+    assert not index.seen(CHUNK)
+    assert not index.seen(OTHER)
+
+
+def test_bands_guarantee_a_shared_bucket_within_max_distance():
+    rng = random.Random(0)
+    for d in (3, DEFAULT_MAX_DISTANCE):
+        index = NearDupIndex(d)
+        for _ in range(200):
+            h = rng.getrandbits(64)
+            flipped = h
+            for bit in rng.sample(range(64), d):
+                flipped ^= 1 << bit
+            assert any(a == b for a, b in zip(index._bands(h), index._bands(flipped)))
+
+
+def test_non_latin_texts_get_features_and_are_not_merged():
+    korean = "서울의 여름 폭염은 노인 인구의 건강에 큰 영향을 미치며 녹지 확대가 중요한 대책으로 논의된다"
+    russian = "Жилищная политика в крупных городах влияет на доступность аренды и миграцию молодых семей"
+    assert simhash64(korean) != 0
+    assert simhash64(russian) != 0
+    index = NearDupIndex()
+    assert not index.seen(korean)
+    assert not index.seen(russian)
+
+
+def test_featureless_text_is_never_a_duplicate():
+    index = NearDupIndex()
+    assert not index.seen("— … —")
+    assert not index.seen("· · ·")
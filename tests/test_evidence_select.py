@@ -0,0 +1,35 @@
+from rag.evidence_select import select_evidence_sentences, split_sentences
+from rag.tokens import estimate_tokens
+
+
+def test_split_sentences_keeps_abbreviations_and_decimals():
+    text = "Dr. Smith et al. (2020) report a 3.5 percent rise, e.g. in Fig. 2. Costs fell! 中文句子。第二句"
+    assert split_sentences(text) == [
+        "Dr. Smith et al. (2020) report a 3.5 percent rise, e.g. in Fig. 2.",
+        "Costs fell!",
+        "中文句子。",
+        "第二句",
+    ]
+
+
+def test_split_sentences_breaks_on_newlines():
+    assert split_sentences("Title line\nBody sentence. Another one.") == [
+        "Title line",
+        "Body sentence.",
+        "Another one.",
+    ]
+
+
+def test_budget_skips_long_sentence_and_keeps_shorter_ones():
+    best = "Solar panel efficiency rose sharply."
+    long = "Solar panel efficiency rose " * 2 + (
+        "as measured across many regional sites and seasons in the northern network of stations over the full decade."
+    )
+    short = "Panel efficiency held."
+    evidence = [{"chunk_id": "c1", "text": f"{best} {long} {short}"}]
+    budget = estimate_tokens(best) + estimate_tokens(short)
+    assert estimate_tokens(long) > budget
+
+    out = select_evidence_sentences(["solar panel efficiency rose"], evidence, token_budget=budget)
+
+    assert out == [f"[c1] {best} … {short}"]
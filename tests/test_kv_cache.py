@@ -0,0 +1,35 @@
+import itertools
+import json
+
+from rag import kv_cache
+from rag.kv_cache import JsonCache
+
+
+def _fake_clock(monkeypatch):
+    ticks = itertools.count()
+    monkeypatch.setattr(kv_cache, "now_ts", lambda: f"2024-01-01T00:00:{next(ticks):02d}Z")
+
+
+def test_roundtrip_persists(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = JsonCache(path)
+    cache.put("k", {"status": "OK"})
+    cache.save()
+
+    assert JsonCache(path).get("k") == {"status": "OK"}
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_save_evicts_least_recently_used(tmp_path, monkeypatch):
+    _fake_clock(monkeypatch)
+    path = tmp_path / "cache.json"
+    cache = JsonCache(path, max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a 被再次使用，b 成为最久未使用
+    cache.put("c", 3)
+    cache.save()
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert sorted(data) == ["a", "c"]
+    assert len(cache) == 2
@@ -0,0 +1,48 @@
+import numpy as np
+
+from rag.mmr import cosine_to_query, mmr_select
+
+
+def _cand(cid, vec, parent=None):
+    return {"chunk_id": cid, "parent_id": parent or cid, "vector": np.asarray(vec, dtype=np.float32)}
+
+
+def test_cosine_to_query_handles_zero_vectors():
+    sims = cosine_to_query([1.0, 0.0], [[2.0, 0.0], [0.0, 3.0], [0.0, 0.0]])
+    assert np.allclose(sims, [1.0, 0.0, 0.0])
+
+
+def test_mmr_prefers_diverse_candidate_over_near_duplicate():
+    query = [1.0, 0.0]
+    cands = [
+        _cand("a", [1.0, 0.05]),
+        _cand("a_dup", [1.0, 0.06]),
+        _cand("b", [0.8, -0.6]),
+    ]
+    out = mmr_select(query, cands, top_n=2, lambda_mult=0.5)
+    assert [c["chunk_id"] for c in out] == ["a", "b"]
+    assert all("_relevance" in c for c in out)
+
+
+def test_mmr_lambda_one_is_pure_relevance():
+    query = [1.0, 0.0]
+    cands = [_cand("b", [0.7, 0.7]), _cand("a", [1.0, 0.05]), _cand("a_dup", [1.0, 0.06])]
+    out = mmr_select(query, cands, top_n=3, lambda_mult=1.0)
+    assert [c["chunk_id"] for c in out] == ["a", "a_dup", "b"]
+
+
+def test_mmr_collapse_parent_caps_children_per_parent():
+    query = [1.0, 0.0]
+    cands = [
+        _cand("p1c1", [1.0, 0.0], "p1"),
+        _cand("p1c2", [0.9, 0.1], "p1"),
+        _cand("p2c1", [0.5, 0.5], "p2"),
+    ]
+    out = mmr_select(query, cands, top_n=3, collapse_parent=True, max_per_parent=1)
+    assert [c["parent_id"] for c in out] == ["p1", "p2"]
+
+
+def test_mmr_without_vectors_keeps_order():
+    cands = [{"chunk_id": "x"}, {"chunk_id": "y"}, {"chunk_id": "z"}]
+    assert mmr_select([1.0], cands, top_n=2) == cands[:2]
+    assert mmr_select([1.0], [], top_n=2) == []
@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from rag.query_cache import QueryCache
+
+
+def test_put_get_roundtrip_drops_vectors(tmp_path):
+    cache = QueryCache(tmp_path, "b1", "h")
+    cache.put("What  is X?", None, [{"chunk_id": "c1", "vector": [0.1], "_distance": 0.5}], ["v1"])
+    results, variants = cache.get("what is x?")
+    assert results == [{"chunk_id": "c1", "_distance": 0.5}]
+    assert variants == ["v1"]
+
+
+def test_concurrent_puts_leave_no_torn_or_temp_files(tmp_path):
+    cache = QueryCache(tmp_path, "b1", "h")
+    rows = [{"chunk_id": f"c{i}", "text": "x" * 2000} for i in range(50)]
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        list(ex.map(lambda _: cache.put("q", None, rows, []), range(32)))
+    assert len(cache.get("q")[0]) == 50
+    assert not list(cache.dir.glob("*.tmp"))
+
+
+def test_new_build_evicts_old_build_dir(tmp_path):
+    QueryCache(tmp_path, "old", "h").put("q", None, [], [])
+    QueryCache(tmp_path, "new", "h")
+    assert not (tmp_path / "old").exists()
+
+
+def test_clear_drops_entries_for_the_current_build(tmp_path):
+    QueryCache(tmp_path / "query_cache", "b1", "h").put("q", None, [{"chunk_id": "c1"}], [])
+    QueryCache.clear(tmp_path)
+    assert QueryCache.for_build(tmp_path, "b1", {}).get("q") is None
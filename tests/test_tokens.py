@@ -0,0 +1,19 @@
+from rag.tokens import estimate_tokens, token_prefix
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    assert estimate_tokens("中文") == 2
+    assert estimate_tokens("中文abcd") == 3
+
+
+def test_token_prefix_matches_estimate():
+    text = "城市热岛 raises night temperatures."
+    prefix = token_prefix(text)
+    assert len(prefix) == len(text) + 1
+    assert prefix[0] == 0
+    # 前缀和按 0.25 token/字符累计，向上取整后与 estimate_tokens 一致
+    for i in range(len(text) + 1):
+        assert -(-prefix[i] // 1) == estimate_tokens(text[:i])
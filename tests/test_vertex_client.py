@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from rag import vertex_client
+
+
+@pytest.fixture
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(vertex_client, "_pool", None)
+    monkeypatch.setattr(vertex_client, "_pool_size", 0)
+    monkeypatch.setattr(vertex_client, "_running", 0)
+    monkeypatch.setattr(vertex_client, "_LOCAL_GRACE_SECONDS", 0.0)
+    monkeypatch.setattr(vertex_client, "_private_api_disabled", set())
+    monkeypatch.setitem(vertex_client._settings, "concurrency", 1)
+
+
+def test_queued_call_deadline_starts_when_it_runs(fresh_pool):
+    release = threading.Event()
+    first = threading.Thread(target=vertex_client.call, args=(release.wait,), kwargs={"timeout": 5})
+    first.start()
+    time.sleep(0.05)
+    threading.Timer(0.3, release.set).start()
+    # 排队等待名额的 0.3s 不计入 0.2s 的超时
+    assert vertex_client.call(lambda: "ok", timeout=0.2) == "ok"
+    first.join()
+
+
+def test_local_timeout_is_not_retryable(fresh_pool):
+    from rag.judge import _is_retryable
+
+    with pytest.raises(vertex_client.CallTimeout) as exc:
+        vertex_client.call(time.sleep, 0.3, timeout=0.05)
+    assert not _is_retryable(exc.value)
+    assert _is_retryable(TimeoutError("504 Deadline Exceeded"))
+
+
+class _FakeSdkModel:
+    def __init__(self):
+        self.seen_timeout = None
+        self._prediction_client = self
+
+    def _prepare_request(self, contents, generation_config):
+        return {"contents": contents}
+
+    def _parse_response(self, response):
+        return response
+
+    def generate_content(self, request, timeout):
+        self.seen_timeout = timeout
+        return request
+
+
+def test_generate_content_passes_request_timeout_to_sdk(fresh_pool):
+    model = _FakeSdkModel()
+    assert vertex_client.generate_content(model, "hi", timeout=7) == {"contents": "hi"}
+    assert model.seen_timeout == 7
+
+
+class _PublicOnlyModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, contents, generation_config=None):
+        self.calls += 1
+        return contents
+
+
+class _ChangedClient:
+    def generate_content(self, request):
+        return request
+
+
+class _ChangedSdkModel(_FakeSdkModel):
+    """私有预测客户端不再接受 timeout 的 SDK 版本。"""
+
+    def __init__(self):
+        super().__init__()
+        self._prediction_client = _ChangedClient()
+
+    def generate_content(self, contents, generation_config=None):
+        return "public"
+
+
+def test_missing_private_api_falls_back_to_public_with_one_warning(fresh_pool, caplog):
+    model = _PublicOnlyModel()
+    assert vertex_client.generate_content(model, "hi", timeout=7) == "hi"
+    assert vertex_client.generate_content(model, "again", timeout=7) == "again"
+    assert model.calls == 2
+    warnings = [r for r in caplog.records if "私有接口不可用" in r.getMessage()]
+    assert len(warnings) == 1
+
+
+def test_changed_private_signature_falls_back_to_public(fresh_pool, caplog):
+    model = _ChangedSdkModel()
+    assert vertex_client.generate_content(model, "hi", timeout=7) == "public"
+    assert "generation" in vertex_client._private_api_disabled
+    assert any("TypeError" in r.getMessage() for r in caplog.records)
+
+
+def test_generation_timeout_is_configured_separately(monkeypatch):
+    monkeypatch.setattr(vertex_client, "_settings", dict(vertex_client._settings))
+    vertex_client.configure({"embedding": {"timeout_seconds": 30}, "judge": {"timeout_seconds": 90}})
+    assert vertex_client._settings["timeout_seconds"] == 30
+    assert vertex_client._settings["generation_timeout_seconds"] == 90
+    vertex_client.configure({"embedding": {"timeout_seconds": 30}})
+    assert vertex_client._settings["generation_timeout_seconds"] == 30